@@ -19,4 +19,12 @@ PY
 fi
 
 python manage.py collectstatic --noinput || true
-exec gunicorn printing_site.wsgi:application --bind 0.0.0.0:8000 --workers 3
+
+if [ "${WARMUP_ON_START:-1}" = "1" ]; then
+    # Once per deploy, before any worker starts: fills the shared cache and reports
+    # estimator profiles still to be sliced; the workers then only warm their own process
+    python manage.py warm_cache || true
+fi
+
+# gunicorn.conf.py binds 0.0.0.0:8000 and warms up each worker before it serves
+exec gunicorn printing_site.wsgi:application -c gunicorn.conf.py
@@ -0,0 +1,23 @@
+"""Gunicorn settings; every worker warms itself up before accepting requests"""
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', 3))
+# Worker warm-up runs before the first heartbeat and must stay well inside this
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+
+
+def post_worker_init(worker):
+    if os.environ.get('WARMUP_ON_START', '1') != '1':
+        return
+    from prints.warmup import warm_up
+
+    try:
+        report = warm_up()
+    except Exception:
+        # A failed warm-up only costs speed; never keep the worker from serving
+        worker.log.exception('Warm-up failed')
+        return
+    worker.log.info('Warm-up finished in %.2fs: %s', report.total, '; '.join(
+        f'{label} {seconds * 1000:.0f}ms' for label, seconds, _ in report.steps
+    ))
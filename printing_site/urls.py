@@ -2,10 +2,11 @@
 URL configuration for printing_site project.
 """
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
 from django.conf.urls.static import static
 from django.http import JsonResponse
+from prints.media import serve_media
 
 def health(_): return JsonResponse({"status":"ok"})
 
@@ -13,9 +14,10 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('prints.urls')),
     path("health", health),
+    # Media is authorized here and handed to nginx via X-Accel-Redirect in production
+    re_path(r'^%s(?P<path>.+)$' % settings.MEDIA_URL.lstrip('/'), serve_media, name='media'),
 ]
 
-# Serve static and media files during development
+# Serve static files during development
 if settings.DEBUG:
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -1,6 +1,106 @@
-from django.contrib import admin
+from datetime import timedelta
+
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.contrib.admin.views.main import ChangeList
+from django.forms.models import BaseInlineFormSet
+from django.db.models import Sum
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 from django.utils.html import format_html
-from .models import Category, PrintItem, PrintImage, PrintComment, PrintLike
+from .catalog import stream_export
+from .models import (
+    Category, DailyEngagement, PrintItem, PrintImage, PrintComment, PrintLike, STLBlob,
+)
+from .paginators import EstimatedCountPaginator
+
+
+CURSOR_VAR = 'cursor'
+
+
+class CursorChangeList(ChangeList):
+    """Changelist paged by primary key instead of OFFSET, with no COUNT queries"""
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def get_results(self, request):
+        queryset = self.queryset.order_by('-pk')
+        cursor = request.GET.get(CURSOR_VAR)
+        if cursor:
+            try:
+                queryset = queryset.filter(pk__lt=int(cursor))
+            except ValueError:
+                pass
+
+        # Fetch one extra row to know whether there is a next page
+        rows = list(queryset[:self.list_per_page + 1])
+        self.result_list = rows[:self.list_per_page]
+        self.next_cursor = self.result_list[-1].pk if len(rows) > self.list_per_page else None
+        self.is_first_page = not cursor
+
+        self.result_count = len(self.result_list)
+        self.full_result_count = None
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.can_show_all = False
+        self.multi_page = self.next_cursor is not None or not self.is_first_page
+        self.paginator = None
+
+    def next_page_url(self):
+        return self.get_query_string({CURSOR_VAR: self.next_cursor})
+
+    def first_page_url(self):
+        return self.get_query_string(remove=[CURSOR_VAR])
+
+
+class CursorPaginationMixin:
+    """Admin mixin for very large tables: keyset paging, newest first, no sorting"""
+    change_list_template = 'admin/prints/cursor_change_list.html'
+    ordering = ['-pk']
+    sortable_by = ()
+    show_full_result_count = False
+
+    def get_changelist(self, request, **kwargs):
+        return CursorChangeList
+
+
+def export_action(fmt):
+    """Admin action streaming the selection as ``fmt`` (see prints.catalog)"""
+    content_types = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+
+    @admin.action(description=f'Export selected as {fmt.upper()}')
+    def export(modeladmin, request, queryset):
+        kind = modeladmin.catalog_kind
+        response = StreamingHttpResponse(
+            stream_export(kind, fmt, queryset=queryset), content_type=content_types[fmt],
+        )
+        response['Content-Disposition'] = f'attachment; filename="{kind}.{fmt}"'
+        return response
+
+    export.__name__ = f'export_{fmt}'
+    return export
+
+
+export_csv = export_action('csv')
+export_jsonl = export_action('jsonl')
+
+
+class FilamentTypeFilter(admin.SimpleListFilter):
+    """Fixed filament choices instead of a DISTINCT scan over every print"""
+    title = 'filament type'
+    parameter_name = 'filament_type'
+
+    def lookups(self, request, model_admin):
+        return [(value, value) for value in PrintItem.COMMON_FILAMENT_TYPES]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(filament_type=self.value())
+        return queryset
 
 
 @admin.register(Category)
@@ -11,20 +111,47 @@ class CategoryAdmin(admin.ModelAdmin):
     prepopulated_fields = {'slug': ('name',)}
 
 
+class PrintImageFormSet(BaseInlineFormSet):
+    """Applies rows whose only change is their order in one UPDATE"""
+
+    def save_existing(self, form, obj, commit=True):
+        if commit and form.changed_data == ['order']:
+            self.moved[obj.pk] = obj.order
+            return obj
+        return super().save_existing(form, obj, commit=commit)
+
+    def save(self, commit=True):
+        self.moved = {}
+        saved = super().save(commit=commit)
+        PrintImage.objects.filter(print_item=self.instance).reorder(self.moved)
+        return saved
+
+
 class PrintImageInline(admin.TabularInline):
     model = PrintImage
+    formset = PrintImageFormSet
     extra = 1
     fields = ['image', 'caption', 'order']
 
 
+class PrintItemActionForm(ActionForm):
+    """Action bar with a target category for the re-categorize action"""
+    category = forms.ModelChoiceField(queryset=Category.objects.all(), required=False)
+
+
 @admin.register(PrintItem)
 class PrintItemAdmin(admin.ModelAdmin):
     list_display = [
         'title', 'category', 'author', 'difficulty', 'status', 
         'views_count', 'likes_count', 'created_at'
     ]
-    list_filter = ['category', 'difficulty', 'status', 'filament_type', 'created_at']
-    search_fields = ['title', 'description', 'author__username']
+    list_filter = ['category', 'difficulty', 'status', FilamentTypeFilter, 'created_at']
+    # Prefix and exact lookups can use the title and username indexes
+    search_fields = ['^title', '=author__username']
+    search_help_text = 'Title prefix or exact author username'
+    autocomplete_fields = ['category', 'author']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     prepopulated_fields = {}
     readonly_fields = ['views_count', 'likes_count', 'downloads_count', 'created_at', 'updated_at']
     
@@ -52,17 +179,66 @@ class PrintItemAdmin(admin.ModelAdmin):
     )
     
     inlines = [PrintImageInline]
+    action_form = PrintItemActionForm
+    actions = ['publish', 'feature', 'unpublish', 'recategorize', 'recount', export_csv, export_jsonl]
+    catalog_kind = 'prints'
     
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('category', 'author')
+    
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if 'stl_file' in form.changed_data and obj.stl_sha256:
+            blob = STLBlob.objects.filter(pk=obj.stl_sha256).first()
+            similar = blob.similar_prints().exclude(pk=obj.pk)[:5] if blob else []
+            if similar:
+                titles = ', '.join(f'"{item.title}" (#{item.pk})' for item in similar)
+                self.message_user(
+                    request, f'This STL matches or closely resembles: {titles}', messages.WARNING,
+                )
+    
+    @admin.action(description='Publish selected prints', permissions=['change'])
+    def publish(self, request, queryset):
+        updated = queryset.publish()
+        self.message_user(request, f'{updated} prints published.')
+    
+    @admin.action(description='Feature selected prints', permissions=['change'])
+    def feature(self, request, queryset):
+        updated = queryset.feature()
+        self.message_user(request, f'{updated} prints featured.')
+    
+    @admin.action(description='Unpublish selected prints (back to draft)', permissions=['change'])
+    def unpublish(self, request, queryset):
+        updated = queryset.unpublish()
+        self.message_user(request, f'{updated} prints moved to draft.')
+    
+    @admin.action(description='Move selected prints to the chosen category', permissions=['change'])
+    def recategorize(self, request, queryset):
+        form = self.action_form(request.POST)
+        category = form.fields['category'].clean(request.POST.get('category'))
+        if category is None:
+            self.message_user(request, 'Choose a category to move the prints to.', messages.ERROR)
+            return
+        updated = queryset.recategorize(category)
+        self.message_user(request, f'{updated} prints moved to {category}.')
+    
+    @admin.action(description='Recount likes for selected prints', permissions=['change'])
+    def recount(self, request, queryset):
+        updated = queryset.recount()
+        self.message_user(request, f'Likes recounted for {updated} prints.')
 
 
 @admin.register(PrintComment)
-class PrintCommentAdmin(admin.ModelAdmin):
+class PrintCommentAdmin(CursorPaginationMixin, admin.ModelAdmin):
     list_display = ['print_item', 'author', 'content_preview', 'created_at']
     list_filter = ['created_at', 'print_item__category']
-    search_fields = ['content', 'author__username', 'print_item__title']
+    list_select_related = ['print_item', 'author']
+    search_fields = ['=author__username', '^print_item__title']
+    search_help_text = 'Exact author username or print title prefix'
+    autocomplete_fields = ['print_item', 'author']
     readonly_fields = ['created_at', 'updated_at']
+    actions = [export_csv, export_jsonl]
+    catalog_kind = 'comments'
     
     def content_preview(self, obj):
         return obj.content[:50] + '...' if len(obj.content) > 50 else obj.content
@@ -70,10 +246,63 @@ class PrintCommentAdmin(admin.ModelAdmin):
 
 
 @admin.register(PrintLike)
-class PrintLikeAdmin(admin.ModelAdmin):
+class PrintLikeAdmin(CursorPaginationMixin, admin.ModelAdmin):
     list_display = ['print_item', 'user', 'created_at']
     list_filter = ['created_at']
-    search_fields = ['print_item__title', 'user__username']
+    list_select_related = ['print_item', 'user']
+    search_fields = ['=user__username', '^print_item__title']
+    search_help_text = 'Exact username or print title prefix'
+    autocomplete_fields = ['print_item', 'user']
+    actions = [export_csv, export_jsonl]
+    catalog_kind = 'likes'
+
+
+@admin.register(STLBlob)
+class STLBlobAdmin(admin.ModelAdmin):
+    list_display = ['sha256', 'ref_count', 'triangle_count', 'volume_mm3', 'fingerprint', 'created_at']
+    search_fields = ['=sha256', '=fingerprint']
+    readonly_fields = [field.name for field in STLBlob._meta.fields]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(DailyEngagement)
+class DailyEngagementAdmin(admin.ModelAdmin):
+    """Engagement dashboard; reads only the rollup table, never the raw event log"""
+    change_list_template = 'admin/prints/dailyengagement/change_list.html'
+    list_display = ['date', 'print_item', 'views', 'likes', 'unlikes', 'comments', 'downloads']
+    list_select_related = ['print_item']
+    date_hierarchy = 'date'
+    search_fields = ['^print_item__title']
+    dashboard_days = 30
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+    
+    def changelist_view(self, request, extra_context=None):
+        since = timezone.localdate() - timedelta(days=self.dashboard_days - 1)
+        recent = DailyEngagement.objects.filter(date__gte=since).order_by()
+        totals = {field: Sum(field) for field in ['views', 'likes', 'unlikes', 'comments', 'downloads']}
+        extra_context = {
+            'dashboard_days': self.dashboard_days,
+            'daily_totals': recent.values('date').annotate(**totals).order_by('-date'),
+            'top_prints': (
+                recent.values('print_item_id', 'print_item__title')
+                .annotate(**totals)
+                .order_by('-views')[:10]
+            ),
+            **(extra_context or {}),
+        }
+        return super().changelist_view(request, extra_context)
 
 
 # Customize admin site
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class PrintsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'prints'
+
+    def ready(self):
+        from . import receivers  # noqa: F401
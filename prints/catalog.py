@@ -0,0 +1,379 @@
+"""
+Streaming export and batched import of the catalog (prints, comments, likes).
+
+Exports walk the table in primary-key order with keyset chunks, so memory
+stays constant no matter how large the table is. Imports validate every row
+on its own, upsert in batches (one transaction per batch) and collect
+per-row errors instead of aborting the load.
+"""
+import csv
+import json
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError, connection, transaction
+from django.db.models import DecimalField, F
+from django.utils import timezone
+
+from . import sitemaps
+from .models import AuthorStats, Category, PrintComment, PrintItem, PrintLike
+
+
+FORMATS = ('csv', 'jsonl')
+DEFAULT_CHUNK_SIZE = 2000
+DEFAULT_BATCH_SIZE = 500
+
+
+class Echo:
+    """File-like object that hands back what is written, for streaming csv.writer"""
+
+    def write(self, value):
+        return value
+
+
+class CatalogSpec:
+    """Describes how one model maps to flat export/import rows"""
+    model = None
+    # Model columns written to exports; ``id`` doubles as the upsert key on import
+    fields = []
+    # Exported columns that are keys of related rows: {column: lookup}
+    related = {}
+    # Fields overwritten when an imported row carries the id of an existing row
+    update_fields = []
+
+    @property
+    def columns(self):
+        return self.fields + list(self.related)
+
+    def export_queryset(self):
+        return self.model.objects.order_by()
+
+    def iter_rows(self, queryset=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Yield export rows as dicts, chunked by primary key"""
+        queryset = self.export_queryset() if queryset is None else queryset
+        queryset = queryset.order_by('pk').values(
+            'pk', *self.fields, **{column: F(lookup) for column, lookup in self.related.items()}
+        )
+        last_pk = None
+        while True:
+            chunk = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+            rows = list(chunk[:chunk_size])
+            if not rows:
+                return
+            last_pk = rows[-1]['pk']
+            for row in rows:
+                del row['pk']
+                yield row
+
+    def prefetch(self, rows):
+        """Resolve related keys for a whole batch in a few queries"""
+        return {}
+
+    def build(self, row, lookups):
+        """Return an unsaved, validated instance for ``row``"""
+        raise NotImplementedError
+
+    def clean_value(self, value):
+        # CSV has no null, an empty cell means "not set"
+        return None if value == '' else value
+
+    def clean_int(self, row, column, errors):
+        """``row[column]`` as an int, None when empty; a bad value is added to ``errors``"""
+        value = self.clean_value(row.get(column, ''))
+        if value is None:
+            return None
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            errors[column] = f'Expected a whole number, got {value!r}'
+            return None
+
+    def save_batch(self, objects):
+        """Insert rows without an id and upsert the rest; return the number written"""
+        fresh = [obj for obj in objects if obj.pk is None]
+        keyed = [obj for obj in objects if obj.pk is not None]
+        written = len(self.model.objects.bulk_create(fresh)) if fresh else 0
+        if keyed:
+            kwargs = {'update_conflicts': True, 'update_fields': self.update_fields}
+            if connection.features.supports_update_conflicts_with_target:
+                kwargs['unique_fields'] = ['id']
+            written += len(self.model.objects.bulk_create(keyed, **kwargs))
+        return written
+
+    def after_import(self, objects):
+        """Hook for keeping derived data consistent once a batch is stored"""
+
+
+def _ints(values):
+    result = set()
+    for value in values:
+        try:
+            result.add(int(value))
+        except (TypeError, ValueError):
+            pass
+    return result
+
+
+def prefetch_prints_and_users(print_ids, usernames):
+    return {
+        'prints': set(PrintItem.objects.filter(pk__in=_ints(print_ids)).values_list('pk', flat=True)),
+        'users': dict(User.objects.filter(username__in=usernames).values_list('username', 'pk')),
+    }
+
+
+class PrintItemSpec(CatalogSpec):
+    model = PrintItem
+    fields = [
+        'id', 'title', 'description', 'difficulty', 'print_time_hours', 'filament_type',
+        'filament_amount_grams', 'layer_height', 'infill_percentage', 'status', 'published_at',
+        'created_at',
+    ]
+    related = {'category_slug': 'category__slug', 'author_username': 'author__username'}
+    update_fields = fields[1:] + ['category', 'author']
+
+    def prefetch(self, rows):
+        slugs = {row.get('category_slug') for row in rows}
+        usernames = {row.get('author_username') for row in rows}
+        return {
+            'categories': dict(Category.objects.filter(slug__in=slugs).values_list('slug', 'pk')),
+            'users': dict(User.objects.filter(username__in=usernames).values_list('username', 'pk')),
+        }
+
+    def build(self, row, lookups):
+        errors = {}
+        pk = self.clean_int(row, 'id', errors)
+        category_id = lookups['categories'].get(row.get('category_slug'))
+        if category_id is None:
+            errors['category_slug'] = f"Unknown category {row.get('category_slug')!r}"
+        author_id = lookups['users'].get(row.get('author_username'))
+        if author_id is None:
+            errors['author_username'] = f"Unknown user {row.get('author_username')!r}"
+        if errors:
+            raise ValidationError(errors)
+
+        values = {field: self.clean_value(row[field]) for field in self.fields[1:] if field in row}
+        self.fill_defaults(values)
+        instance = PrintItem(id=pk, category_id=category_id, author_id=author_id, **values)
+        instance.full_clean(exclude=['id', 'category', 'author'], validate_unique=False)
+        # bulk_create skips save(), so stamp publication here
+        if instance.status in PrintItem.PUBLIC_STATUSES and instance.published_at is None:
+            instance.published_at = timezone.now()
+        return instance
+
+    def fill_defaults(self, values):
+        """Use the model default for omitted or empty columns, as a form would"""
+        for name in self.fields[1:]:
+            field = PrintItem._meta.get_field(name)
+            if values.get(name) is None and field.has_default():
+                default = field.get_default()
+                # layer_height defaults to the float 0.20, which full_clean
+                # reads as 0.2000000000000000111 and rejects
+                if isinstance(field, DecimalField):
+                    default = Decimal(str(default))
+                values[name] = default
+
+    def after_import(self, objects):
+        AuthorStats.objects.refresh({obj.author_id for obj in objects})
+        sitemaps.invalidate_section('prints')
+        sitemaps.invalidate_section('categories')
+
+
+class PrintCommentSpec(CatalogSpec):
+    model = PrintComment
+    fields = ['id', 'print_item_id', 'content', 'created_at']
+    related = {'author_username': 'author__username'}
+    update_fields = ['print_item', 'author', 'content', 'created_at']
+
+    def prefetch(self, rows):
+        return prefetch_prints_and_users(
+            {row.get('print_item_id') for row in rows},
+            {row.get('author_username') for row in rows},
+        )
+
+    def build(self, row, lookups):
+        errors = {}
+        pk = self.clean_int(row, 'id', errors)
+        print_item_id = self.clean_int(row, 'print_item_id', errors)
+        if 'print_item_id' not in errors and print_item_id not in lookups['prints']:
+            errors['print_item_id'] = f"Unknown print {row.get('print_item_id')!r}"
+        author_id = lookups['users'].get(row.get('author_username'))
+        if author_id is None:
+            errors['author_username'] = f"Unknown user {row.get('author_username')!r}"
+        if errors:
+            raise ValidationError(errors)
+
+        instance = PrintComment(
+            id=pk,
+            print_item_id=print_item_id,
+            author_id=author_id,
+            content=row.get('content', ''),
+            created_at=self.clean_value(row.get('created_at', '')) or timezone.now(),
+        )
+        instance.full_clean(exclude=['id', 'print_item', 'author'], validate_unique=False)
+        return instance
+
+
+class PrintLikeSpec(CatalogSpec):
+    model = PrintLike
+    fields = ['print_item_id', 'created_at']
+    related = {'user_username': 'user__username'}
+
+    def prefetch(self, rows):
+        return prefetch_prints_and_users(
+            {row.get('print_item_id') for row in rows},
+            {row.get('user_username') for row in rows},
+        )
+
+    def build(self, row, lookups):
+        errors = {}
+        print_item_id = self.clean_int(row, 'print_item_id', errors)
+        if 'print_item_id' not in errors and print_item_id not in lookups['prints']:
+            errors['print_item_id'] = f"Unknown print {row.get('print_item_id')!r}"
+        user_id = lookups['users'].get(row.get('user_username'))
+        if user_id is None:
+            errors['user_username'] = f"Unknown user {row.get('user_username')!r}"
+        if errors:
+            raise ValidationError(errors)
+        instance = PrintLike(
+            print_item_id=print_item_id,
+            user_id=user_id,
+            created_at=self.clean_value(row.get('created_at', '')) or timezone.now(),
+        )
+        instance.full_clean(exclude=['print_item', 'user'], validate_unique=False)
+        return instance
+
+    def save_batch(self, objects):
+        # A like carries no data beyond its key, so existing ones are left alone.
+        # bulk_create returns every object, skipped or not, so count new pairs instead
+        pairs = {(obj.print_item_id, obj.user_id) for obj in objects}
+        existing = set(PrintLike.objects.filter(
+            print_item_id__in={pk for pk, _ in pairs}, user_id__in={pk for _, pk in pairs},
+        ).values_list('print_item_id', 'user_id'))
+        PrintLike.objects.bulk_create(objects, ignore_conflicts=True)
+        return len(pairs - existing)
+
+    def after_import(self, objects):
+        PrintItem.objects.filter(pk__in={obj.print_item_id for obj in objects}).recount()
+
+
+SPECS = {
+    'prints': PrintItemSpec(),
+    'comments': PrintCommentSpec(),
+    'likes': PrintLikeSpec(),
+}
+
+
+def stream_csv(spec, rows):
+    """Yield CSV lines (header first) for ``rows``"""
+    writer = csv.DictWriter(Echo(), fieldnames=spec.columns, extrasaction='ignore')
+    yield writer.writeheader()
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def stream_jsonl(spec, rows):
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
+
+
+def stream_export(kind, fmt, queryset=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield the serialized export of ``kind`` as text chunks"""
+    spec = SPECS[kind]
+    rows = spec.iter_rows(queryset, chunk_size=chunk_size)
+    if fmt == 'csv':
+        return stream_csv(spec, rows)
+    return stream_jsonl(spec, rows)
+
+
+def read_rows(fileobj, fmt):
+    """Yield (line_number, row) from an open text file; malformed lines yield an error"""
+    if fmt == 'csv':
+        reader = csv.DictReader(fileobj)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_number, line in enumerate(fileobj, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            yield line_number, ValidationError(f'Invalid JSON: {exc}')
+            continue
+        if not isinstance(row, dict):
+            yield line_number, ValidationError('Expected a JSON object')
+            continue
+        # Normalize to the string form CSV produces
+        yield line_number, {key: '' if value is None else str(value) for key, value in row.items()}
+
+
+class ImportResult:
+    def __init__(self):
+        self.valid = 0
+        self.written = 0
+        self.errors = []  # (line_number, message)
+
+    def add_error(self, line_number, error):
+        if isinstance(error, ValidationError) and hasattr(error, 'message_dict'):
+            message = '; '.join(
+                f'{field}: {" ".join(messages)}' for field, messages in error.message_dict.items()
+            )
+        elif isinstance(error, ValidationError):
+            message = ' '.join(error.messages)
+        else:
+            message = str(error)
+        self.errors.append((line_number, message))
+
+
+def import_rows(kind, numbered_rows, batch_size=DEFAULT_BATCH_SIZE, dry_run=False):
+    """Validate and upsert rows batch by batch, collecting per-row errors"""
+    spec = SPECS[kind]
+    result = ImportResult()
+    batch = []
+    for line_number, row in numbered_rows:
+        if isinstance(row, ValidationError):
+            result.add_error(line_number, row)
+            continue
+        batch.append((line_number, row))
+        if len(batch) >= batch_size:
+            _import_batch(spec, batch, result, dry_run)
+            batch = []
+    if batch:
+        _import_batch(spec, batch, result, dry_run)
+    return result
+
+
+def _import_batch(spec, batch, result, dry_run):
+    lookups = spec.prefetch([row for _, row in batch])
+    valid = []
+    for line_number, row in batch:
+        try:
+            valid.append((line_number, spec.build(row, lookups)))
+        except (ValidationError, ValueError, KeyError) as exc:
+            result.add_error(line_number, exc)
+    result.valid += len(valid)
+    if dry_run or not valid:
+        return
+
+    objects = [obj for _, obj in valid]
+    try:
+        with transaction.atomic():
+            result.written += spec.save_batch(objects)
+            spec.after_import(objects)
+        return
+    except DatabaseError:
+        pass
+
+    # The batch hit a database-level error; retry row by row to isolate it
+    stored = []
+    for line_number, obj in valid:
+        try:
+            with transaction.atomic():
+                result.written += spec.save_batch([obj])
+            stored.append(obj)
+        except DatabaseError as exc:
+            result.add_error(line_number, exc)
+    if stored:
+        spec.after_import(stored)
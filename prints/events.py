@@ -0,0 +1,152 @@
+"""
+Buffered engagement events.
+
+Views call ``record()``, which only appends to an in-process buffer. The buffer
+is written with a single bulk INSERT once it holds ENGAGEMENT_BUFFER_SIZE
+events or its oldest event is ENGAGEMENT_FLUSH_SECONDS old (checked on every
+record and at the end of every request), and at interpreter exit.
+
+The ``rollup_engagement`` command folds the log into DailyEngagement. Each
+run recomputes whole days from the log and upserts them, so it is idempotent
+and picks up events that were inserted late or out of id order.
+
+Events still buffered when a worker is killed are lost; the log feeds
+statistics, not the counters shown on the site, so that trade is acceptable.
+"""
+import atexit
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Count, Max, Min
+from django.utils import timezone
+
+from .models import DailyEngagement, EngagementEvent, PrintItem, RollupCursor
+
+
+logger = logging.getLogger(__name__)
+
+
+class EventBuffer:
+    def __init__(self, max_events=None, max_age=None):
+        self.max_events = max_events
+        self.max_age = max_age
+        self.events = []
+        self.oldest = None
+        self.lock = threading.Lock()
+
+    def limits(self):
+        return (
+            self.max_events or getattr(settings, 'ENGAGEMENT_BUFFER_SIZE', 200),
+            self.max_age if self.max_age is not None else getattr(settings, 'ENGAGEMENT_FLUSH_SECONDS', 5),
+        )
+
+    def add(self, event):
+        with self.lock:
+            if not self.events:
+                self.oldest = time.monotonic()
+            self.events.append(event)
+        self.flush_if_due()
+
+    def flush_if_due(self):
+        max_events, max_age = self.limits()
+        if len(self.events) >= max_events or (
+            self.events and time.monotonic() - self.oldest >= max_age
+        ):
+            self.flush()
+
+    def flush(self):
+        """Write every buffered event in one INSERT; returns the number written"""
+        with self.lock:
+            events, self.events = self.events, []
+        if not events:
+            return 0
+        try:
+            # Savepoint, so a failed flush cannot poison a surrounding transaction
+            with transaction.atomic():
+                EngagementEvent.objects.bulk_create(events, batch_size=1000)
+        except DatabaseError:
+            logger.exception('Dropped %d engagement events', len(events))
+            return 0
+        return len(events)
+
+
+buffer = EventBuffer()
+atexit.register(buffer.flush)
+
+
+def record(kind, print_item, user=None):
+    """Queue one engagement event; ``print_item`` may be an instance or a pk"""
+    buffer.add(EngagementEvent(
+        kind=kind,
+        print_item_id=getattr(print_item, 'pk', print_item),
+        user_id=user.pk if user is not None and user.is_authenticated else None,
+        created_at=timezone.now(),
+    ))
+
+
+ROLLUP_NAME = 'daily_engagement'
+ROLLUP_FIELDS = {'view': 'views', 'like': 'likes', 'unlike': 'unlikes', 'comment': 'comments', 'download': 'downloads'}
+
+
+def day_bounds(day):
+    start = timezone.make_aware(datetime.combine(day, datetime.min.time()))
+    return start, start + timedelta(days=1)
+
+
+def rollup_days(last_event_id, upto_event_id):
+    """Days whose totals may have changed since ``last_event_id`` was rolled up"""
+    today = timezone.localdate()
+    # In-flight batches land in the recent days, so those are always redone
+    days = {today, today - timedelta(days=1)}
+    span = EngagementEvent.objects.filter(id__gt=last_event_id, id__lte=upto_event_id).aggregate(
+        first=Min('created_at'), last=Max('created_at'),
+    )
+    if span['first'] is not None:
+        day, last = timezone.localdate(span['first']), timezone.localdate(span['last'])
+        while day <= last:
+            days.add(day)
+            day += timedelta(days=1)
+    return sorted(days)
+
+
+def rollup_day(day, batch_size=1000):
+    """Recompute one day's DailyEngagement rows from the log; returns the row count"""
+    start, end = day_bounds(day)
+    counts = (
+        EngagementEvent.objects.filter(created_at__gte=start, created_at__lt=end)
+        .order_by()
+        .values_list('print_item_id', 'kind')
+        .annotate(total=Count('id'))
+    )
+    rows = {}
+    for print_item_id, kind, total in counts:
+        row = rows.setdefault(print_item_id, DailyEngagement(date=day, print_item_id=print_item_id))
+        setattr(row, ROLLUP_FIELDS[kind], total)
+
+    # The log keeps events of deleted prints; their totals have nowhere to go
+    existing = set(PrintItem.objects.filter(pk__in=rows).values_list('pk', flat=True))
+    rows = [row for print_item_id, row in rows.items() if print_item_id in existing]
+
+    kwargs = {'update_conflicts': True, 'update_fields': list(ROLLUP_FIELDS.values())}
+    if connection.features.supports_update_conflicts_with_target:
+        kwargs['unique_fields'] = ['date', 'print_item']
+    DailyEngagement.objects.bulk_create(rows, batch_size=batch_size, **kwargs)
+    return len(rows)
+
+
+def rollup(batch_size=1000):
+    """Fold new events into DailyEngagement; safe to run repeatedly or concurrently"""
+    buffer.flush()
+    with transaction.atomic():
+        cursor, _ = RollupCursor.objects.get_or_create(name=ROLLUP_NAME)
+        cursor = RollupCursor.objects.select_for_update().get(pk=cursor.pk)
+        upto = EngagementEvent.objects.aggregate(last=Max('id'))['last'] or 0
+        days = rollup_days(cursor.last_event_id, upto)
+        rows = sum(rollup_day(day, batch_size) for day in days)
+        cursor.last_event_id = upto
+        cursor.save(update_fields=['last_event_id', 'updated_at'])
+    return days, rows
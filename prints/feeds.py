@@ -0,0 +1,84 @@
+from django.contrib.syndication.views import Feed
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.urls import reverse_lazy
+from django.utils.feedgenerator import Atom1Feed
+from django.utils.text import Truncator
+
+from .models import PrintItem
+from .sitemaps import CACHE_TIMEOUT, get_version
+
+
+FEED_SIZE = 50
+
+
+class CachedFeed(Feed):
+    """Feed whose rendered body is cached until a public print changes"""
+    cache_name = None
+
+    def __call__(self, request, *args, **kwargs):
+        root = request.build_absolute_uri('/')
+        key = f'feed:{self.cache_name}:v{get_version("all")}:{root}'
+        cached = cache.get(key)
+        if cached is not None:
+            content, headers = cached
+            response = HttpResponse(content, content_type=headers.pop('Content-Type'))
+            for header, value in headers.items():
+                response[header] = value
+            return response
+        response = super().__call__(request, *args, **kwargs)
+        headers = {header: response[header] for header in ('Content-Type', 'Last-Modified') if header in response}
+        cache.set(key, (response.content, headers), CACHE_TIMEOUT)
+        return response
+
+
+class LatestPrintsFeed(CachedFeed):
+    cache_name = 'latest-rss'
+    title = '3D Printing Hub - New prints'
+    link = reverse_lazy('prints:print_list')
+    description = 'Recently published 3D prints'
+    statuses = PrintItem.PUBLIC_STATUSES
+
+    def items(self):
+        return (
+            PrintItem.objects.filter(status__in=self.statuses)
+            .select_related('author', 'category')
+            .order_by('-published_at', '-pk')[:FEED_SIZE]
+        )
+
+    def item_title(self, item):
+        return item.title
+
+    def item_description(self, item):
+        return Truncator(item.description).words(60)
+
+    def item_pubdate(self, item):
+        return item.published_at or item.created_at
+
+    def item_updateddate(self, item):
+        return item.updated_at
+
+    def item_author_name(self, item):
+        return item.author.username
+
+    def item_categories(self, item):
+        return [item.category.name]
+
+
+class FeaturedPrintsFeed(LatestPrintsFeed):
+    cache_name = 'featured-rss'
+    title = '3D Printing Hub - Featured prints'
+    description = 'Prints featured by the 3D Printing Hub team'
+    statuses = ('featured',)
+
+
+class LatestPrintsAtomFeed(LatestPrintsFeed):
+    cache_name = 'latest-atom'
+    feed_type = Atom1Feed
+    subtitle = LatestPrintsFeed.description
+
+
+class FeaturedPrintsAtomFeed(FeaturedPrintsFeed):
+    cache_name = 'featured-atom'
+    feed_type = Atom1Feed
+    subtitle = FeaturedPrintsFeed.description
@@ -0,0 +1,95 @@
+"""
+Gallery images of a print, for prints with too many to render at once.
+
+    GET  /prints/<id>/gallery/?page=2&per_page=24   one page of images, in order
+    POST /prints/<id>/gallery/order/  {"order": [image ids]}   new order, one UPDATE
+
+The detail page renders the first page and fetches the rest from the JSON API
+as the visitor scrolls. Each image carries its resized derivatives for
+``srcset`` and the placeholder to paint while it loads.
+"""
+from django.contrib.auth.decorators import login_required
+from django.core.paginator import Paginator
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.views.decorators.http import require_GET, require_POST
+
+from .media import can_view
+from .models import PrintImage, PrintItem
+from .uploads import can_upload, parse_payload
+
+
+GALLERY_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+IMAGE_FIELDS = ('pk', 'print_item_id', 'image', 'caption', 'order', 'placeholder', 'color')
+
+
+def gallery_images(print_item):
+    # pk breaks ties so pages never overlap
+    return print_item.images.only(*IMAGE_FIELDS).order_by('order', 'pk')
+
+
+def image_data(image):
+    return {
+        'id': image.pk,
+        'caption': image.caption,
+        'order': image.order,
+        'url': image.image.url,
+        'derivatives': image.derivative_urls(),
+        'placeholder': image.placeholder,
+        'color': image.color,
+    }
+
+
+@require_GET
+def gallery(request, pk):
+    """One page of a print's gallery images"""
+    print_item = get_object_or_404(PrintItem.objects.only('pk', 'status', 'author_id'), pk=pk)
+    if not can_view(request.user, print_item):
+        raise Http404
+    try:
+        per_page = int(request.GET.get('per_page', GALLERY_PAGE_SIZE))
+    except ValueError:
+        return JsonResponse({'error': 'per_page must be a number'}, status=400)
+    if not 1 <= per_page <= MAX_PAGE_SIZE:
+        return JsonResponse({'error': f'per_page must be between 1 and {MAX_PAGE_SIZE}'}, status=400)
+
+    paginator = Paginator(gallery_images(print_item), per_page)
+    page = paginator.get_page(request.GET.get('page'))
+    next_url = None
+    if page.has_next():
+        next_url = f"{reverse('prints:gallery', args=[pk])}?page={page.next_page_number()}&per_page={per_page}"
+    return JsonResponse({
+        'count': paginator.count,
+        'page': page.number,
+        'num_pages': paginator.num_pages,
+        'next': next_url,
+        'images': [image_data(image) for image in page],
+    })
+
+
+@login_required
+@require_POST
+def gallery_reorder(request, pk):
+    """Reorder a print's gallery from the full list of its image ids"""
+    print_item = get_object_or_404(PrintItem.objects.only('pk', 'author_id'), pk=pk)
+    if not can_upload(request.user, print_item):
+        return JsonResponse({'error': 'You cannot edit the gallery of this print'}, status=403)
+    data = parse_payload(request)
+    if not isinstance(data, dict):
+        return JsonResponse({'error': 'Expected a JSON object'}, status=400)
+
+    ids = data.getlist('order') if hasattr(data, 'getlist') else data.get('order')
+    try:
+        ids = [int(image_id) for image_id in ids]
+    except (TypeError, ValueError):
+        return JsonResponse({'error': 'order must be a list of image ids'}, status=400)
+    current = set(PrintImage.objects.filter(print_item=print_item).values_list('pk', flat=True))
+    if len(ids) != len(current) or set(ids) != current:
+        return JsonResponse({'error': 'order must list every image of this print exactly once'}, status=400)
+
+    PrintImage.objects.filter(print_item=print_item).reorder(
+        {image_id: order for order, image_id in enumerate(ids)}
+    )
+    return JsonResponse({'order': ids})
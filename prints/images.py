@@ -0,0 +1,104 @@
+"""
+Resized derivatives of uploaded images.
+
+A derivative lives next to its source as ``<source>.<width>w.webp`` so the
+source (and therefore the owning print) can be recovered from its name.
+
+Each image is also summarized once, at upload, into a placeholder stored on
+its row: a ~16px WEBP as a data URI plus the dominant colour. Templates inline
+both as the card background, so a card paints immediately with no request
+beyond the page itself and the real image fades in over it.
+"""
+import base64
+import io
+import logging
+import re
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+
+DERIVATIVE_WIDTHS = (400, 800)
+DERIVATIVE_QUALITY = 80
+DERIVATIVE_RE = re.compile(r'\.(\d+)w\.webp$')
+PLACEHOLDER_SIZE = 16
+PLACEHOLDER_QUALITY = 40
+PLACEHOLDER_COLORS = 8
+
+logger = logging.getLogger(__name__)
+
+
+def derivative_name(name, width):
+    return f'{name}.{width}w.webp'
+
+
+def source_name(name):
+    """Return the source image name for a derivative name, or ``name`` unchanged"""
+    return DERIVATIVE_RE.sub('', name)
+
+
+def render_derivatives(source, widths=DERIVATIVE_WIDTHS):
+    """Return ``{width: webp_bytes}`` for an image path or file; safe to run in a worker process"""
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+        derivatives = {}
+        for width in widths:
+            resized = image.copy()
+            # thumbnail() never upscales and keeps the aspect ratio
+            resized.thumbnail((width, width * 4), Image.LANCZOS)
+            buffer = io.BytesIO()
+            resized.save(buffer, 'WEBP', quality=DERIVATIVE_QUALITY, method=4)
+            derivatives[width] = buffer.getvalue()
+    return derivatives
+
+
+def store_derivatives(field_file, widths=DERIVATIVE_WIDTHS):
+    """Render the derivatives of a stored image next to it, replacing older ones"""
+    with field_file.storage.open(field_file.name) as f:
+        rendered = render_derivatives(f, widths)
+    for width, content in rendered.items():
+        name = derivative_name(field_file.name, width)
+        if field_file.storage.exists(name):
+            field_file.storage.delete(name)
+        field_file.storage.save(name, ContentFile(content))
+
+
+def render_placeholder(source):
+    """Return ``(data_uri, '#rrggbb')`` for an image path or file object"""
+    with Image.open(source) as image:
+        # Lets the JPEG decoder downscale while decoding instead of afterwards
+        image.draft('RGB', (PLACEHOLDER_SIZE * 4, PLACEHOLDER_SIZE * 4))
+        image = ImageOps.exif_transpose(image)
+        image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+        image.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE), Image.BILINEAR)
+    buffer = io.BytesIO()
+    image.save(buffer, 'WEBP', quality=PLACEHOLDER_QUALITY)
+    data_uri = 'data:image/webp;base64,' + base64.b64encode(buffer.getvalue()).decode('ascii')
+
+    # The most common colour of a small palette is the dominant one; the mean
+    # would mix a subject and its background into a colour found in neither
+    palette = image.convert('RGB').quantize(colors=PLACEHOLDER_COLORS)
+    _, index = max(palette.getcolors())
+    red, green, blue = palette.getpalette()[index * 3:index * 3 + 3]
+    return data_uri, f'#{red:02x}{green:02x}{blue:02x}'
+
+
+def placeholder_for(field_file):
+    """Placeholder of an uploaded or stored image, ``('', '')`` when it cannot be read"""
+    if not field_file:
+        return '', ''
+    try:
+        if field_file._committed:
+            with field_file.storage.open(field_file.name) as f:
+                return render_placeholder(f)
+        upload = field_file.file
+        upload.seek(0)
+        try:
+            return render_placeholder(upload)
+        finally:
+            upload.seek(0)
+    except (OSError, ValueError, Image.DecompressionBombError) as exc:
+        logger.warning('Cannot render placeholder for %s: %s', field_file.name, exc)
+        return '', ''
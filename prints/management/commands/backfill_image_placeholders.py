@@ -0,0 +1,82 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Q
+from PIL import Image
+
+from prints.images import render_placeholder
+from prints.models import PrintImage, PrintItem
+
+
+# (model, image field, placeholder field, colour field)
+TARGETS = [
+    (PrintItem, 'main_image', 'main_image_placeholder', 'main_image_color'),
+    (PrintImage, 'image', 'placeholder', 'color'),
+]
+
+
+def _placeholder(path):
+    try:
+        return path, render_placeholder(path), None
+    except (OSError, ValueError, Image.DecompressionBombError) as exc:
+        return path, None, str(exc)
+
+
+class Command(BaseCommand):
+    help = 'Render blur placeholders and dominant colours for stored images that have none'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Processes used for decoding images',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Rows updated per query',
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Re-render placeholders that are already set',
+        )
+
+    def handle(self, *args, **options):
+        # Forked workers must not inherit open database connections
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=max(options['workers'], 1)) as pool:
+            for target in TARGETS:
+                updated, failed = self.backfill(pool, *target, options)
+                self.stdout.write(self.style.SUCCESS(
+                    f'{target[0]._meta.verbose_name_plural}: {updated} placeholders rendered, {failed} failed'
+                ))
+
+    def backfill(self, pool, model, image_field, placeholder_field, color_field, options):
+        rows = model.objects.exclude(Q(**{image_field: ''}) | Q(**{f'{image_field}__isnull': True}))
+        if not options['all']:
+            rows = rows.filter(**{placeholder_field: ''})
+        rows = list(rows.order_by('pk').values_list('pk', image_field))
+
+        updated = failed = 0
+        batch_size = max(options['batch_size'], 1)
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            paths = [default_storage.path(name) for _, name in batch]
+            objs = []
+            # map() keeps input order, so results line up with the batch
+            for (pk, _), (path, rendered, error) in zip(batch, pool.map(_placeholder, paths, chunksize=8)):
+                if error:
+                    failed += 1
+                    self.stdout.write(self.style.WARNING(f'Skipping {path}: {error}'))
+                    continue
+                placeholder, color = rendered
+                objs.append(model(pk=pk, **{placeholder_field: placeholder, color_field: color}))
+            model.objects.bulk_update(objs, [placeholder_field, color_field])
+            updated += len(objs)
+        return updated, failed
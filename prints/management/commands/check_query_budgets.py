@@ -0,0 +1,227 @@
+"""
+Query-count regression check for every view in prints.urls.
+
+Each view is rendered twice in a throwaway test database: once seeded with a
+small dataset and once with a larger one. A view whose query count grows with
+the data has an N+1 (usually a template following a relation per row), and a
+view that needs more queries than its pinned budget in prints/query_budgets.json
+has regressed. Either way the offending queries are printed and the command
+exits non-zero. After an intended change, re-pin the budgets with --update.
+"""
+import json
+import re
+import struct
+import tempfile
+from collections import Counter
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from prints import events, ratelimit, urls
+from prints.estimator import get_profile, slice_file, store_profiles
+from prints.models import AuthorStats, Category, PrintComment, PrintImage, PrintItem, PrintLike, STLUpload
+
+
+BUDGETS_FILE = Path(__file__).resolve().parents[2] / 'query_budgets.json'
+PLACEHOLDER = 'data:image/webp;base64,UklGRh4AAABXRUJQVlA4TBEAAAAvAAAAAAfQ//73v/+BiOh/AAA='
+
+
+def tetrahedron_stl(size=10.0):
+    """Binary STL of a small tetrahedron, enough for the estimator to slice"""
+    a, b, c, d = (0, 0, 0), (size, 0, 0), (0, size, 0), (0, 0, size)
+    faces = [(a, c, b), (a, b, d), (a, d, c), (b, c, d)]
+    body = b''.join(
+        struct.pack('<12fH', 0, 0, 0, *v1, *v2, *v3, 0) for v1, v2, v3 in faces
+    )
+    return b'\0' * 80 + struct.pack('<I', len(faces)) + body
+
+
+def cases(data):
+    """``(url name, method, url kwargs, payload, user)`` for every view in prints.urls"""
+    item = {'pk': data['print'].pk}
+    staff = data['staff']
+    return [
+        ('home', 'get', {}, None, None),
+        ('print_list', 'get', {}, None, None),
+        ('print_detail', 'get', item, None, staff),
+        ('print_estimate', 'get', item, None, None),
+        ('download_stl', 'get', item, None, None),
+        ('category_detail', 'get', {'slug': data['category'].slug}, None, None),
+        ('author_detail', 'get', {'username': data['author'].username}, None, None),
+        ('like_print', 'post', item, None, staff),
+        ('add_comment', 'post', item, {'content': 'Nice print'}, staff),
+        ('gallery', 'get', item, None, None),
+        ('gallery_reorder', 'post', item, {'order': data['gallery'][::-1]}, staff),
+        ('rate_limit_metrics', 'get', {}, None, staff),
+        ('stl_upload_create', 'post', {}, {'print_id': data['print'].pk, 'filename': 'part.stl', 'size': 84}, staff),
+        ('stl_upload_detail', 'get', {'pk': data['upload'].pk}, None, staff),
+        ('sitemap_index', 'get', {}, None, None),
+        ('sitemap_section', 'get', {'section': 'prints', 'shard': 0}, None, None),
+        ('feed_latest', 'get', {}, None, None),
+        ('feed_latest_atom', 'get', {}, None, None),
+        ('feed_featured', 'get', {}, None, None),
+        ('feed_featured_atom', 'get', {}, None, None),
+    ]
+
+
+def seed(size):
+    """Seed ``size`` authors and categories with ``size`` prints each; returns the objects views are asked for"""
+    staff = User.objects.create_user('staff', password='pw', is_staff=True)
+    authors = [User.objects.create_user(f'author{i}', password='pw') for i in range(size)]
+    categories = [Category.objects.create(name=f'Category {i}', slug=f'category-{i}') for i in range(size)]
+    PrintItem.objects.bulk_create([
+        PrintItem(
+            title=f'Print {c}-{i}',
+            description='Seeded print',
+            category=category,
+            author=authors[i % size],
+            print_time_hours=1,
+            filament_amount_grams=10,
+            main_image=f'prints/images/seed-{c}-{i}.jpg',
+            main_image_placeholder=PLACEHOLDER,
+            main_image_color='#808080',
+            # Every category gets featured and published prints
+            status='featured' if i % 2 else 'published',
+        )
+        for c, category in enumerate(categories)
+        for i in range(size)
+    ])
+    item = PrintItem.objects.filter(status='published').order_by('pk').first()
+    PrintComment.objects.bulk_create([
+        PrintComment(print_item=item, author=author, content='Seeded comment') for author in authors
+    ])
+    PrintLike.objects.bulk_create([PrintLike(print_item=item, user=author) for author in authors])
+    PrintItem.objects.filter(pk=item.pk).recount()
+    item.stl_file = ContentFile(tetrahedron_stl(), name='seed.stl')
+    item.save(update_fields=['stl_file'])
+    # Estimates only read stored profiles; ingest_models or rebuild_stl_blobs would have sliced it
+    store_profiles({item.stl_sha256: slice_file(item.stl_file.path)})
+    PrintImage.objects.bulk_create([
+        PrintImage(print_item=item, image=f'prints/gallery/seed-{i}.jpg', placeholder=PLACEHOLDER, order=i)
+        for i in range(size)
+    ])
+    gallery = list(PrintImage.objects.filter(print_item=item).values_list('pk', flat=True))
+    upload = STLUpload.objects.create(print_item=item, user=staff, filename='part.stl', size=84)
+    AuthorStats.objects.refresh([author.pk for author in authors])
+    return {
+        'staff': staff, 'author': item.author, 'category': item.category, 'print': item,
+        'upload': upload, 'gallery': gallery,
+    }
+
+
+def normalize(sql):
+    """Replace literals so the same statement for different rows compares equal"""
+    return re.sub(r"'[^']*'|\b\d+\b", '?', sql)
+
+
+class Command(BaseCommand):
+    help = 'Check that every view in prints.urls runs a constant number of queries within its budget'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--small', type=int, default=2, help='Seed size of the first run')
+        parser.add_argument('--large', type=int, default=6, help='Seed size of the second run')
+        parser.add_argument(
+            '--update',
+            action='store_true',
+            help=f'Pin the measured counts as the new budgets in {BUDGETS_FILE.name}',
+        )
+
+    def handle(self, *args, **options):
+        if not 1 <= options['small'] < options['large']:
+            raise CommandError('--large must be bigger than --small')
+
+        setup_test_environment(debug=True)
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            # A private cache, so clearing it between views leaves the site's shared cache alone
+            with tempfile.TemporaryDirectory() as media, override_settings(
+                MEDIA_ROOT=media,
+                STL_UPLOAD_TEMP_DIR=Path(media) / 'uploads',
+                CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+            ):
+                small = self.measure(options['small'])
+                call_command('flush', interactive=False, verbosity=0)
+                ContentType.objects.clear_cache()
+                large = self.measure(options['large'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        if options['update']:
+            budgets = {name: max(len(small[name]), len(large[name])) for name in small}
+            BUDGETS_FILE.write_text(json.dumps(budgets, indent=2, sort_keys=True) + '\n')
+            self.stdout.write(self.style.SUCCESS(f'Pinned {len(budgets)} budgets in {BUDGETS_FILE}'))
+            return
+        budgets = json.loads(BUDGETS_FILE.read_text()) if BUDGETS_FILE.exists() else {}
+        self.report(small, large, budgets, options['verbosity'])
+
+    def measure(self, size):
+        """Return ``{url name: [sql, ...]}`` for one seed size"""
+        data = seed(size)
+        planned = cases(data)
+        missing = {p.name for p in urls.urlpatterns} - {name for name, *_ in planned}
+        if missing:
+            raise CommandError(f'No query budget case for: {", ".join(sorted(missing))}')
+
+        queries = {}
+        for name, method, kwargs, payload, user in planned:
+            # Every view starts cold: no cached pages, full rate limit buckets, empty event buffer
+            cache.clear()
+            ratelimit.buckets.buckets.clear()
+            events.buffer.flush()
+            get_profile.cache_clear()
+            client = Client()
+            if user is not None:
+                client.force_login(user)
+            url = reverse(f'prints:{name}', kwargs=kwargs)
+            with CaptureQueriesContext(connection) as captured:
+                response = getattr(client, method)(url, payload or {})
+                if response.streaming:
+                    b''.join(response.streaming_content)
+            if response.status_code >= 400:
+                raise CommandError(f'{method.upper()} {url} returned {response.status_code}')
+            queries[name] = [query['sql'] for query in captured.captured_queries]
+        return queries
+
+    def report(self, small, large, budgets, verbosity):
+        failures = 0
+        for name in small:
+            counts = f'{len(small[name]):3d} -> {len(large[name]):3d}'
+            budget = budgets.get(name)
+            problems = []
+            if len(large[name]) > len(small[name]):
+                grown = Counter(map(normalize, large[name])) - Counter(map(normalize, small[name]))
+                problems.append(('grows with the data; repeated queries:', [
+                    f'{count} more x {sql}' for sql, count in grown.most_common()
+                ]))
+            if budget is None:
+                problems.append(('has no pinned budget (run with --update)', []))
+            elif len(large[name]) > budget:
+                problems.append((f'exceeds its budget of {budget}:', large[name]))
+
+            if not problems:
+                self.stdout.write(f'{name:<22} {counts}  ok (budget {budget})')
+                if verbosity >= 2:
+                    for i, sql in enumerate(large[name], 1):
+                        self.stdout.write(f'    {i:3d}. {sql}')
+                continue
+            failures += 1
+            self.stdout.write(self.style.ERROR(f'{name:<22} {counts}  FAILED'))
+            for message, lines in problems:
+                self.stdout.write(f'    {message}')
+                for i, line in enumerate(lines, 1):
+                    self.stdout.write(f'    {i:3d}. {line}')
+
+        if failures:
+            raise CommandError(f'{failures} views failed their query budget')
+        self.stdout.write(self.style.SUCCESS(f'All {len(small)} views within their query budgets'))
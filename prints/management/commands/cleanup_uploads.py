@@ -0,0 +1,28 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from prints.models import STLUpload
+from prints.uploads import discard
+
+
+class Command(BaseCommand):
+    help = 'Delete chunked STL uploads that were abandoned mid-way'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours',
+            type=int,
+            default=24,
+            help='Age (since the last chunk) after which an upload counts as abandoned',
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['hours'])
+        stale = STLUpload.objects.filter(status='uploading', updated_at__lt=cutoff)
+        count = 0
+        for upload in stale.iterator():
+            discard(upload)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f'Discarded {count} abandoned uploads'))
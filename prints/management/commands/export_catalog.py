@@ -0,0 +1,34 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from prints.catalog import DEFAULT_CHUNK_SIZE, FORMATS, SPECS, stream_export
+
+
+class Command(BaseCommand):
+    help = 'Stream prints, comments or likes to CSV/JSONL with constant memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(SPECS), help='What to export')
+        parser.add_argument('--format', choices=FORMATS, default='csv')
+        parser.add_argument(
+            '--output', '-o',
+            help='File to write to (defaults to stdout)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help='Rows fetched per query',
+        )
+
+    def handle(self, *args, **options):
+        chunks = stream_export(options['kind'], options['format'], chunk_size=options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+                for chunk in chunks:
+                    output.write(chunk)
+            self.stderr.write(self.style.SUCCESS(f"Exported {options['kind']} to {options['output']}"))
+        else:
+            for chunk in chunks:
+                sys.stdout.write(chunk)
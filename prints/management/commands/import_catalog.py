@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from prints.catalog import DEFAULT_BATCH_SIZE, FORMATS, SPECS, import_rows, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Import prints, comments or likes from CSV/JSONL in batched upserts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(SPECS), help='What to import')
+        parser.add_argument('path', help='CSV or JSONL file to read')
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            help='Input format (defaults to the file extension)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help='Rows per batch; each batch is written in one transaction',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Validate every row without writing anything',
+        )
+        parser.add_argument(
+            '--max-errors',
+            type=int,
+            default=50,
+            help='How many row errors to print',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.json')) else 'csv')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        try:
+            with open(path, newline='', encoding='utf-8') as source:
+                result = import_rows(
+                    options['kind'],
+                    read_rows(source, fmt),
+                    batch_size=options['batch_size'],
+                    dry_run=options['dry_run'],
+                )
+        except OSError as exc:
+            raise CommandError(f'Cannot read {path}: {exc}')
+
+        for line_number, message in result.errors[:options['max_errors']]:
+            self.stdout.write(self.style.WARNING(f'Line {line_number}: {message}'))
+        if len(result.errors) > options['max_errors']:
+            self.stdout.write(f"... and {len(result.errors) - options['max_errors']} more errors")
+
+        verb = 'Validated' if options['dry_run'] else 'Imported'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {options['kind']}: {result.valid} rows valid, {result.written} written, "
+            f"{len(result.errors)} rejected"
+        ))
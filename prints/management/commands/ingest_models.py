@@ -0,0 +1,334 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.utils import timezone
+from PIL import Image
+
+from prints import sitemaps
+from prints.estimator import slice_file, store_profiles
+from prints.images import derivative_name, render_derivatives, render_placeholder
+from prints.models import AuthorStats, Category, PrintImage, PrintItem, STLBlob
+from prints.storage import stl_storage
+from prints.stl import STLError, analyze_stl
+
+
+PLA_DENSITY_G_PER_CM3 = Decimal('1.24')
+# Rough extrusion rate used when the manifest has no print time
+GRAMS_PER_HOUR = 12
+
+
+def _analyze(path):
+    try:
+        return path, analyze_stl(path), None
+    except (OSError, STLError) as exc:
+        return path, None, str(exc)
+
+
+def _slice(path):
+    try:
+        return path, slice_file(path), None
+    except (OSError, STLError) as exc:
+        return path, None, str(exc)
+
+
+def _derivatives(path):
+    try:
+        return path, (render_derivatives(path), render_placeholder(path)), None
+    except (OSError, ValueError, Image.DecompressionBombError) as exc:
+        return path, None, str(exc)
+
+
+class Command(BaseCommand):
+    help = 'Ingest a directory or zip of STL models and images described by a JSON manifest'
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help='Directory or .zip archive with the model files')
+        parser.add_argument(
+            '--manifest',
+            help='JSON manifest (defaults to manifest.json inside the source)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Processes used for hashing, mesh analysis and slicing, image resizing and placeholders',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Models stored and inserted per transaction',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Analyze everything but store nothing',
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        source = options['source']
+        workdir = None
+        if zipfile.is_zipfile(source):
+            workdir = tempfile.mkdtemp(prefix='ingest-')
+            self.extract(source, workdir)
+            root = workdir
+        elif os.path.isdir(source):
+            root = source
+        else:
+            raise CommandError(f'{source} is neither a directory nor a zip archive')
+
+        try:
+            entries = self.load_manifest(options['manifest'] or os.path.join(root, 'manifest.json'), root)
+            self.ingest(entries, options)
+        finally:
+            if workdir:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+        self.stdout.write(f'Finished in {time.monotonic() - started:.1f}s')
+
+    def extract(self, archive, target):
+        with zipfile.ZipFile(archive) as zf:
+            for member in zf.namelist():
+                path = os.path.realpath(os.path.join(target, member))
+                if not path.startswith(os.path.realpath(target) + os.sep):
+                    raise CommandError(f'Refusing to extract {member!r} outside the archive root')
+            zf.extractall(target)
+
+    def load_manifest(self, path, root):
+        try:
+            with open(path, encoding='utf-8') as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as exc:
+            raise CommandError(f'Cannot read manifest {path}: {exc}')
+        if not isinstance(entries, list):
+            raise CommandError('The manifest must be a JSON list of models')
+
+        valid = []
+        for number, entry in enumerate(entries, 1):
+            if not isinstance(entry, dict):
+                self.stdout.write(self.style.WARNING(f'Skipping manifest entry {number}: not an object'))
+                continue
+            images = entry.get('images', [])
+            if not isinstance(entry.get('stl'), str) or not entry['stl']:
+                self.stdout.write(self.style.WARNING(f'Skipping manifest entry {number}: missing "stl"'))
+                continue
+            if not isinstance(images, list) or not all(isinstance(image, str) for image in images):
+                self.stdout.write(self.style.WARNING(
+                    f'Skipping manifest entry {number}: "images" must be a list of file names'
+                ))
+                continue
+            entry['stl_path'] = os.path.join(root, entry['stl'])
+            entry['image_paths'] = [os.path.join(root, image) for image in images]
+            valid.append(entry)
+        return valid
+
+    def ingest(self, entries, options):
+        workers = max(options['workers'], 1)
+        # Forked workers must not inherit open database connections
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            analyses = {}
+            for path, stats, error in pool.map(_analyze, [e['stl_path'] for e in entries], chunksize=4):
+                if error:
+                    self.stdout.write(self.style.WARNING(f'Skipping {path}: {error}'))
+                else:
+                    analyses[path] = stats
+
+            # Content hash is the idempotency key: anything already stored is skipped
+            hashes = {stats['sha256'] for stats in analyses.values()}
+            existing = set(
+                PrintItem.objects.filter(stl_sha256__in=hashes).values_list('stl_sha256', flat=True)
+            )
+            pending, seen = [], set(existing)
+            for entry in entries:
+                stats = analyses.get(entry['stl_path'])
+                if stats is None or stats['sha256'] in seen:
+                    continue
+                seen.add(stats['sha256'])
+                entry['stats'] = stats
+                pending.append(entry)
+            self.stdout.write(
+                f'{len(analyses)} models analyzed, {len(existing)} already ingested, '
+                f'{len(pending)} to import'
+            )
+            if options['dry_run'] or not pending:
+                return
+
+            categories = dict(Category.objects.values_list('slug', 'pk'))
+            authors = dict(User.objects.filter(
+                username__in={e.get('author') for e in pending}
+            ).values_list('username', 'pk'))
+
+            batch_size = max(options['batch_size'], 1)
+            for start in range(0, len(pending), batch_size):
+                batch = pending[start:start + batch_size]
+                image_paths = [path for e in batch for path in e['image_paths']]
+                derivatives = {}
+                for path, rendered, error in pool.map(_derivatives, image_paths):
+                    if error:
+                        self.stdout.write(self.style.WARNING(f'Skipping image {path}: {error}'))
+                    else:
+                        derivatives[path] = rendered
+                # Sliced here so print estimates never slice in a request
+                profiles = {}
+                for path, fields, error in pool.map(_slice, [e['stl_path'] for e in batch]):
+                    if error:
+                        self.stdout.write(self.style.WARNING(f'Cannot slice {path}: {error}'))
+                    else:
+                        profiles[path] = fields
+                created = self.store_batch(batch, derivatives, profiles, categories, authors)
+                self.stdout.write(self.style.SUCCESS(
+                    f'Imported {created} models ({start + len(batch)}/{len(pending)})'
+                ))
+
+    def store_file(self, upload_to, sha256, path):
+        """Store under a hash-derived name so reruns reuse what a crashed run wrote"""
+        name = f'{upload_to}{sha256[:16]}-{os.path.basename(path)}'
+        if not default_storage.exists(name):
+            with open(path, 'rb') as f:
+                name = default_storage.save(name, f)
+        return name
+
+    def store_image(self, upload_to, sha256, path, rendered):
+        """Store an image and its derivatives; returns ``(name, placeholder, color)``"""
+        derivatives, (placeholder, color) = rendered
+        name = self.store_file(upload_to, sha256, path)
+        for width, content in derivatives.items():
+            variant = derivative_name(name, width)
+            if not default_storage.exists(variant):
+                default_storage.save(variant, ContentFile(content))
+        return name, placeholder, color
+
+    def build_item(self, entry, categories, authors):
+        stats = entry['stats']
+        grams = entry.get('filament_amount_grams')
+        if grams is None:
+            grams = round(Decimal(stats['volume_mm3']) / 1000 * PLA_DENSITY_G_PER_CM3)
+        hours = entry.get('print_time_hours') or max(1, round(int(grams) / GRAMS_PER_HOUR))
+        status = entry.get('status', 'draft')
+        return PrintItem(
+            title=entry.get('title') or os.path.splitext(os.path.basename(entry['stl']))[0],
+            description=entry.get('description', ''),
+            category_id=categories[entry['category']],
+            author_id=authors[entry['author']],
+            difficulty=entry.get('difficulty', 'beginner'),
+            print_time_hours=hours,
+            filament_type=entry.get('filament_type', 'PLA'),
+            filament_amount_grams=grams,
+            # Converted (and rejected when malformed) by full_clean()
+            layer_height=str(entry.get('layer_height', '0.20')),
+            infill_percentage=entry.get('infill_percentage', 20),
+            status=status,
+            published_at=timezone.now() if status in PrintItem.PUBLIC_STATUSES else None,
+            stl_sha256=stats['sha256'],
+        )
+
+    def clean_item(self, item):
+        """Validate a built item so one bad manifest entry cannot fail the whole batch"""
+        # Category and author were resolved already, the STL is stored after this,
+        # and manifests may leave the description out
+        item.full_clean(exclude=['category', 'author', 'stl_file', 'description'], validate_unique=False)
+        # Positive-integer ranges are only validated on backends that report them (not SQLite)
+        errors = {
+            field: 'Must not be negative'
+            for field in ('print_time_hours', 'filament_amount_grams', 'infill_percentage')
+            if getattr(item, field) < 0
+        }
+        if item.infill_percentage > 100:
+            errors['infill_percentage'] = 'Must be between 0 and 100'
+        if errors:
+            raise ValidationError(errors)
+
+    def store_batch(self, batch, derivatives, profiles, categories, authors):
+        items, gallery = [], {}
+        for entry in batch:
+            if entry.get('category') not in categories or entry.get('author') not in authors:
+                self.stdout.write(self.style.WARNING(
+                    f"Skipping {entry['stl']}: unknown category or author"
+                ))
+                continue
+            sha256 = entry['stats']['sha256']
+            try:
+                item = self.build_item(entry, categories, authors)
+                self.clean_item(item)
+            except ValidationError as exc:
+                problems = '; '.join(f'{field}: {" ".join(errors)}' for field, errors in exc.message_dict.items())
+                self.stdout.write(self.style.WARNING(f"Skipping {entry['stl']}: {problems}"))
+                continue
+            except (TypeError, ValueError) as exc:
+                self.stdout.write(self.style.WARNING(f"Skipping {entry['stl']}: invalid value ({exc})"))
+                continue
+            # Only now that the entry is valid is its file moved into storage
+            item.stl_file = stl_storage().adopt(
+                entry['stl_path'], f"prints/stl_files/{os.path.basename(entry['stl_path'])}", sha256,
+            )
+            images = [path for path in entry['image_paths'] if path in derivatives]
+            if images:
+                item.main_image, item.main_image_placeholder, item.main_image_color = self.store_image(
+                    'prints/images/', sha256, images[0], derivatives[images[0]]
+                )
+            gallery[sha256] = [
+                self.store_image('prints/gallery/', sha256, path, derivatives[path])
+                for path in images[1:]
+            ]
+            items.append(item)
+
+        with transaction.atomic():
+            PrintItem.objects.bulk_create(items)
+            # MySQL does not return primary keys from bulk_create, so look them up by hash
+            pks = dict(PrintItem.objects.filter(
+                stl_sha256__in=gallery
+            ).values_list('stl_sha256', 'pk'))
+            PrintImage.objects.bulk_create([
+                PrintImage(
+                    print_item_id=pks[sha256], image=name, placeholder=placeholder, color=color, order=order,
+                )
+                for sha256, stored in gallery.items()
+                for order, (name, placeholder, color) in enumerate(stored)
+            ])
+            # bulk_create skips the save() hooks that keep STL reference counts;
+            # the workers already measured each mesh, so the blob is not read again
+            stats = {entry['stats']['sha256']: entry['stats'] for entry in batch if 'stats' in entry}
+            for item in items:
+                STLBlob.objects.retain(item.stl_sha256, item.stl_file.name, stats=stats[item.stl_sha256])
+            stored = {item.stl_sha256 for item in items}
+            store_profiles({
+                entry['stats']['sha256']: profiles[entry['stl_path']]
+                for entry in batch
+                if entry['stl_path'] in profiles and entry['stats']['sha256'] in stored
+            })
+            AuthorStats.objects.refresh({item.author_id for item in items})
+        sitemaps.invalidate_section('prints')
+        sitemaps.invalidate_section('categories')
+        self.report_similar(items)
+        return len(items)
+
+    def report_similar(self, items):
+        """Warn about meshes that look like already stored ones"""
+        hashes = {item.stl_sha256: item for item in items}
+        fingerprints = dict(
+            STLBlob.objects.filter(pk__in=hashes).exclude(fingerprint='').values_list('fingerprint', 'sha256')
+        )
+        matches = (
+            STLBlob.objects.filter(fingerprint__in=fingerprints)
+            .exclude(pk__in=hashes)
+            .values_list('fingerprint', flat=True)
+            .distinct()
+        )
+        for fp in matches:
+            self.stdout.write(self.style.WARNING(
+                f'{hashes[fingerprints[fp]].title!r} looks like an existing model (fingerprint {fp})'
+            ))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from prints.models import AuthorStats, PrintItem
+
+
+class Command(BaseCommand):
+    help = 'Recompute every AuthorStats row from the prints table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Authors recomputed per query',
+        )
+
+    def handle(self, *args, **options):
+        # Authors with prints, plus stale rows of authors that no longer have any
+        authors = set(PrintItem.objects.order_by().values_list('author_id', flat=True).distinct())
+        authors.update(AuthorStats.objects.values_list('user_id', flat=True))
+        AuthorStats.objects.refresh(authors, batch_size=max(options['batch_size'], 1))
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt stats for {len(authors)} authors'))
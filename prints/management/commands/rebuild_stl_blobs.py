@@ -0,0 +1,126 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from prints.estimator import slice_file, store_profiles
+from prints.models import PrintItem, STLBlob
+from prints.stl import STLError, load_stl, mesh_stats, sha256_file
+from prints.storage import ContentAddressedStorage, stl_storage
+
+
+def _measure(path):
+    try:
+        return mesh_stats(load_stl(path))
+    except (OSError, STLError):
+        return None
+
+
+def _slice(path):
+    try:
+        return slice_file(path)
+    except (OSError, STLError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Move STL files into content-addressed storage, rebuild reference counts, '
+        'measure new meshes and slice their estimate profiles'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would change without touching files or rows',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Processes used for measuring and slicing meshes',
+        )
+
+    def handle(self, *args, **options):
+        storage = stl_storage()
+        dry_run = options['dry_run']
+
+        # Files uploaded before content addressing: hash, adopt, repoint
+        moved = 0
+        legacy = PrintItem.objects.exclude(stl_file='').exclude(stl_file__isnull=True).only('pk', 'stl_file')
+        for item in legacy.iterator():
+            name = item.stl_file.name
+            if ContentAddressedStorage.sha256_from_name(name) or not storage.exists(name):
+                continue
+            moved += 1
+            if dry_run:
+                continue
+            sha256 = sha256_file(storage.path(name))
+            new_name = storage.adopt(storage.path(name), name, sha256)
+            PrintItem.objects.filter(pk=item.pk).update(stl_file=new_name, stl_sha256=sha256)
+            if not PrintItem.objects.filter(stl_file=name).exists():
+                storage.delete(name)
+        self.stdout.write(f'{moved} STL files moved into content-addressed storage')
+        if dry_run:
+            return
+
+        # Make sure every referenced hash has a blob, then recount in one UPDATE
+        referenced = (
+            PrintItem.objects.exclude(stl_sha256='')
+            .values_list('stl_sha256', 'stl_file')
+            .order_by()
+            .distinct()
+        )
+        known = set(STLBlob.objects.values_list('sha256', flat=True))
+        for sha256, name in referenced:
+            if sha256 not in known:
+                STLBlob.objects.register(sha256, name)
+                known.add(sha256)
+
+        references = (
+            PrintItem.objects.filter(stl_sha256=OuterRef('pk'))
+            .order_by()
+            .values('stl_sha256')
+            .annotate(total=Count('pk'))
+            .values('total')
+        )
+        STLBlob.objects.update(ref_count=Coalesce(Subquery(references), 0))
+
+        orphans = list(STLBlob.objects.filter(ref_count=0).values_list('sha256', 'name'))
+        for sha256, name in orphans:
+            storage.delete(name)
+        STLBlob.objects.filter(ref_count=0).delete()
+        self.stdout.write(self.style.SUCCESS(
+            f'Reference counts rebuilt for {len(known)} blobs, {len(orphans)} orphans removed'
+        ))
+
+        # Blobs whose file could not be read when they were registered, or registered here
+        pending = list(STLBlob.objects.filter(triangle_count=0).values_list('sha256', 'name'))
+        measured = 0
+        # Forked workers must not inherit open database connections
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=max(options['workers'], 1)) as pool:
+            paths = [storage.path(name) for _, name in pending]
+            for (sha256, name), stats in zip(pending, pool.map(_measure, paths, chunksize=4)):
+                if stats is None:
+                    self.stdout.write(self.style.WARNING(f'Cannot measure {name}'))
+                    continue
+                STLBlob.objects.filter(pk=sha256).update(**STLBlob.objects.stats_fields(stats))
+                measured += 1
+            self.stdout.write(self.style.SUCCESS(f'{measured} of {len(pending)} unmeasured meshes measured'))
+
+            # Estimates only look profiles up, so every new mesh is sliced here (or by ingest_models)
+            unsliced = list(STLBlob.objects.filter(layer_profile__isnull=True).values_list('sha256', 'name'))
+            paths = [storage.path(name) for _, name in unsliced]
+            profiles = {}
+            for (sha256, name), fields in zip(unsliced, pool.map(_slice, paths)):
+                if fields is None:
+                    self.stdout.write(self.style.WARNING(f'Cannot slice {name}'))
+                    continue
+                profiles[sha256] = fields
+            store_profiles(profiles)
+        self.stdout.write(self.style.SUCCESS(f'{len(profiles)} of {len(unsliced)} estimate profiles sliced'))
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from prints.events import rollup
+
+
+class Command(BaseCommand):
+    help = 'Roll the engagement event log up into daily per-print totals (run periodically, e.g. from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Rollup rows upserted per INSERT',
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        days, rows = rollup(batch_size=max(options['batch_size'], 1))
+        self.stdout.write(self.style.SUCCESS(
+            f'Rolled up {len(days)} days ({days[0]} to {days[-1]}) into {rows} rows '
+            f'in {time.monotonic() - started:.1f}s'
+        ))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from prints.warmup import TOP_CATEGORIES, TOP_PRINTS, warm_up
+
+
+class Command(BaseCommand):
+    help = 'Precompile templates and prime caches for the most visited pages, reporting timings'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--categories',
+            type=int,
+            default=TOP_CATEGORIES,
+            help='Number of largest categories whose pages are rendered',
+        )
+        parser.add_argument(
+            '--prints',
+            type=int,
+            default=TOP_PRINTS,
+            help='Number of most viewed prints whose pages are rendered',
+        )
+
+    def handle(self, *args, **options):
+        # Run once per deploy, so it also reports top prints whose profiles are not sliced yet
+        report = warm_up(top_categories=options['categories'], top_prints=options['prints'], profiles=True)
+        for line in report.lines():
+            self.stdout.write(line)
+        self.stdout.write(self.style.SUCCESS(f'Warm-up finished in {report.total:.2f}s'))
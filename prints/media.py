@@ -0,0 +1,212 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.db.models import F
+from django.http import (
+    FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse,
+)
+from django.shortcuts import get_object_or_404
+from django.utils._os import safe_join
+from django.utils.http import http_date, quote_etag
+from django.utils.text import slugify
+from django.views.decorators.http import require_safe
+
+from . import events
+from .images import source_name
+from .models import AuthorStats, PrintImage, PrintItem
+
+
+# Upload directories of the media-bearing fields
+IMAGE_DIR = 'prints/images/'
+STL_DIR = 'prints/stl_files/'
+GALLERY_DIR = 'prints/gallery/'
+
+PUBLIC_CACHE_CONTROL = 'public, max-age=86400'
+PRIVATE_CACHE_CONTROL = 'private, no-cache'
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def can_view(user, print_item):
+    """Published prints are public, drafts only for their author and staff"""
+    if print_item.status in PrintItem.PUBLIC_STATUSES:
+        return True
+    return user.is_authenticated and (user.is_staff or user.pk == print_item.author_id)
+
+
+def resolve_print_item(name, user):
+    """Return a PrintItem owning the media file ``name`` that ``user`` may view, or None"""
+    # Derivatives inherit the permissions of their source image
+    name = source_name(name)
+    fields = ('pk', 'status', 'author_id', 'title')
+    if name.startswith(IMAGE_DIR):
+        return PrintItem.objects.filter(main_image=name).only(*fields).first()
+    if name.startswith(STL_DIR):
+        # Identical uploads share one content-addressed file, so several prints
+        # can own it; any public one authorizes, then the requester's own drafts
+        owners = PrintItem.objects.filter(stl_file=name).only(*fields)
+        public = owners.filter(status__in=PrintItem.PUBLIC_STATUSES).first()
+        if public is not None or not user.is_authenticated:
+            return public
+        return (owners if user.is_staff else owners.filter(author_id=user.pk)).first()
+    if name.startswith(GALLERY_DIR):
+        image = (
+            PrintImage.objects.filter(image=name)
+            .select_related('print_item')
+            .only('print_item__id', 'print_item__status', 'print_item__author_id', 'print_item__title')
+            .first()
+        )
+        return image.print_item if image else None
+    return None
+
+
+def parse_range(header, size):
+    """Parse a single ``bytes=`` range into (start, end) inclusive, or None"""
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    start, end = match.groups()
+    if start:
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+    elif end:
+        # Suffix range: the last N bytes
+        start = max(size - int(end), 0)
+        end = size - 1
+    else:
+        return None
+    if start > end or start >= size:
+        return None
+    return start, end
+
+
+def iter_file_range(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(STREAM_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def accel_response(name, content_type):
+    """Let nginx transfer the bytes from its internal media location"""
+    response = HttpResponse(content_type=content_type)
+    # Percent-encoded: a non-ASCII header value would be MIME-encoded, which nginx cannot resolve
+    response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT_PREFIX.rstrip('/') + '/' + quote(name)
+    return response
+
+
+def stream_response(request, path, stat, content_type, etag):
+    """Serve the file from this process with conditional GET and Range support"""
+    size = stat.st_size
+
+    if request.headers.get('If-None-Match') == etag:
+        return HttpResponseNotModified()
+
+    byte_range = None
+    range_header = request.headers.get('Range')
+    if range_header and request.headers.get('If-Range', etag) == etag:
+        byte_range = parse_range(range_header, size)
+        if byte_range is None:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    if byte_range:
+        start, end = byte_range
+        length = end - start + 1
+        response = StreamingHttpResponse(
+            iter_file_range(path, start, length), status=206, content_type=content_type,
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = length
+    else:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+        response.headers.pop('Content-Disposition', None)
+        response['Content-Length'] = size
+
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    return response
+
+
+def serve_file(request, name, print_item):
+    """Hand off or stream the media file ``name``, already authorized through ``print_item``"""
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, name)
+    except SuspiciousFileOperation:
+        raise Http404
+    if not os.path.isfile(full_path) and name != source_name(name):
+        # Images stored before derivatives were rendered on upload have none
+        name = source_name(name)
+        full_path = safe_join(settings.MEDIA_ROOT, name)
+    if not os.path.isfile(full_path):
+        raise Http404
+
+    stat = os.stat(full_path)
+    etag = quote_etag(f'{int(stat.st_mtime):x}-{stat.st_size:x}')
+    content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    is_stl = name.startswith(STL_DIR)
+    if is_stl:
+        content_type = 'model/stl'
+
+    if settings.MEDIA_ACCEL_REDIRECT_PREFIX:
+        response = accel_response(name, content_type)
+    else:
+        response = stream_response(request, full_path, stat, content_type, etag)
+        response['ETag'] = etag
+        response['Accept-Ranges'] = 'bytes'
+
+    if is_stl:
+        # Stored names are content hashes, so name the download after the print
+        filename = f'{slugify(print_item.title) or "model"}.stl'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    if print_item.status in PrintItem.PUBLIC_STATUSES:
+        response['Cache-Control'] = PUBLIC_CACHE_CONTROL
+    else:
+        response['Cache-Control'] = PRIVATE_CACHE_CONTROL
+        response['Vary'] = 'Cookie'
+    return response
+
+
+@require_safe
+def serve_media(request, path):
+    """Authorize access to an uploaded file, then hand off or stream the bytes"""
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    name = os.path.relpath(full_path, settings.MEDIA_ROOT).replace(os.sep, '/')
+
+    print_item = resolve_print_item(name, request.user)
+    # Unknown files and drafts look the same to unauthorized clients
+    if print_item is None or not can_view(request.user, print_item):
+        raise Http404
+    return serve_file(request, name, print_item)
+
+
+@require_safe
+def download_stl(request, pk):
+    """STL download of one print; counted here because the file itself may be shared"""
+    print_item = get_object_or_404(PrintItem.objects.only('pk', 'status', 'author_id', 'title', 'stl_file'), pk=pk)
+    if not print_item.stl_file or not can_view(request.user, print_item):
+        raise Http404
+    response = serve_file(request, print_item.stl_file.name, print_item)
+
+    # Count a download once per transfer, not per resumed range
+    is_first_range = request.headers.get('Range', 'bytes=0-').startswith('bytes=0-')
+    if request.method == 'GET' and response.status_code in (200, 206) and is_first_range:
+        PrintItem.objects.filter(pk=print_item.pk).update(downloads_count=F('downloads_count') + 1)
+        events.record('download', print_item, request.user)
+        if print_item.status in PrintItem.PUBLIC_STATUSES:
+            AuthorStats.objects.bump(print_item.author_id, downloads_count=1)
+    return response
@@ -0,0 +1,147 @@
+import mimetypes
+import os
+import posixpath
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import MiddlewareNotUsed, SuspiciousFileOperation
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date, quote_etag
+
+from .storage import ENCODING_SUFFIXES
+
+
+# Hashed names never change content, so they can be cached for a year
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Unhashed names (admin JS loading siblings by name etc.) must revalidate
+UNHASHED_CACHE_CONTROL = 'public, max-age=300'
+
+
+def parse_accept_encoding(header):
+    """Return the set of content codings the client accepts (q > 0)"""
+    accepted = set()
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            accepted.add(coding)
+    return accepted
+
+
+class StaticAsset:
+    """Stat results for one collected file and its precompressed variants"""
+
+    def __init__(self, name, path, immutable):
+        stat = os.stat(path)
+        self.name = name
+        self.path = path
+        self.size = stat.st_size
+        self.last_modified = http_date(stat.st_mtime)
+        self.etag_base = f'{int(stat.st_mtime):x}-{stat.st_size:x}'
+        self.content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        self.cache_control = IMMUTABLE_CACHE_CONTROL if immutable else UNHASHED_CACHE_CONTROL
+        self.variants = {}
+        for encoding, suffix in ENCODING_SUFFIXES:
+            variant_path = path + suffix
+            if os.path.isfile(variant_path):
+                self.variants[encoding] = (variant_path, os.path.getsize(variant_path))
+
+    def select(self, accepted):
+        """Pick the smallest representation the client can decode"""
+        for encoding, _ in ENCODING_SUFFIXES:
+            if encoding in self.variants and (encoding in accepted or '*' in accepted):
+                path, size = self.variants[encoding]
+                return encoding, path, size
+        return None, self.path, self.size
+
+    def etag(self, encoding):
+        # Each representation needs its own validator
+        return quote_etag(f'{self.etag_base}-{encoding}' if encoding else self.etag_base)
+
+
+class StaticFilesMiddleware:
+    """Serve STATIC_ROOT in production with precompressed variants and far-future caching
+
+    Development keeps using ``django.conf.urls.static`` from ``printing_site.urls``.
+    """
+
+    def __init__(self, get_response):
+        if settings.DEBUG or not settings.STATIC_ROOT:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.prefix = urlparse(settings.STATIC_URL).path
+        self.root = str(settings.STATIC_ROOT)
+        self.assets = {}
+        self._hashed_names = None
+
+    def __call__(self, request):
+        if request.method in ('GET', 'HEAD') and request.path_info.startswith(self.prefix):
+            response = self.serve(request, request.path_info[len(self.prefix):])
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+    @property
+    def hashed_names(self):
+        if self._hashed_names is None:
+            hashed_files = getattr(staticfiles_storage, 'hashed_files', {})
+            self._hashed_names = set(hashed_files.values())
+        return self._hashed_names
+
+    def get_asset(self, name):
+        name = posixpath.normpath(name).lstrip('/')
+        if name in self.assets:
+            return self.assets[name]
+        if name.startswith('..') or name.endswith(tuple(s for _, s in ENCODING_SUFFIXES)):
+            return None
+        try:
+            path = safe_join(self.root, name)
+        except SuspiciousFileOperation:
+            return None
+        if not os.path.isfile(path):
+            return None
+        # Collected files don't change for the lifetime of the process
+        asset = StaticAsset(name, path, immutable=name in self.hashed_names)
+        self.assets[name] = asset
+        return asset
+
+    def serve(self, request, name):
+        asset = self.get_asset(name)
+        if asset is None:
+            return None
+
+        accepted = parse_accept_encoding(request.headers.get('Accept-Encoding', ''))
+        encoding, path, size = asset.select(accepted)
+        etag = asset.etag(encoding)
+
+        if request.headers.get('If-None-Match') == etag:
+            response = HttpResponseNotModified()
+        else:
+            if request.method == 'HEAD':
+                response = HttpResponse(content_type=asset.content_type)
+            else:
+                response = FileResponse(open(path, 'rb'), content_type=asset.content_type)
+                # The variant's file name would otherwise leak into the headers
+                response.headers.pop('Content-Disposition', None)
+            response['Content-Length'] = size
+            if encoding:
+                response['Content-Encoding'] = encoding
+            response['Last-Modified'] = asset.last_modified
+
+        response['ETag'] = etag
+        response['Cache-Control'] = asset.cache_control
+        if asset.variants:
+            response['Vary'] = 'Accept-Encoding'
+        return response
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-19 14:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prints', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='printimage',
+            name='image',
+            field=models.ImageField(db_index=True, upload_to='prints/gallery/'),
+        ),
+        migrations.AlterField(
+            model_name='printitem',
+            name='main_image',
+            field=models.ImageField(blank=True, db_index=True, null=True, upload_to='prints/images/'),
+        ),
+        migrations.AlterField(
+            model_name='printitem',
+            name='stl_file',
+            field=models.FileField(blank=True, db_index=True, null=True, upload_to='prints/stl_files/'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-19 14:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prints', '0002_media_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='printitem',
+            name='filament_type',
+            field=models.CharField(db_index=True, default='PLA', max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='printitem',
+            name='title',
+            field=models.CharField(db_index=True, max_length=200),
+        ),
+    ]
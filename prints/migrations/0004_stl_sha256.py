@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 14:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prints', '0003_admin_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='printitem',
+            name='stl_sha256',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-19 14:35
+
+from django.db import migrations, models
+import prints.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prints', '0005_stl_upload'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='STLBlob',
+            fields=[
+                ('sha256', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('name', models.CharField(help_text='Storage name of the file', max_length=255)),
+                ('size', models.PositiveBigIntegerField(default=0)),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+                ('triangle_count', models.PositiveIntegerField(default=0)),
+                ('volume_mm3', models.FloatField(default=0)),
+                ('surface_area_mm2', models.FloatField(default=0)),
+                ('bbox_x_mm', models.FloatField(default=0)),
+                ('bbox_y_mm', models.FloatField(default=0)),
+                ('bbox_z_mm', models.FloatField(default=0)),
+                ('fingerprint', models.CharField(blank=True, db_index=True, max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'STL blob',
+            },
+        ),
+        migrations.AlterField(
+            model_name='printitem',
+            name='stl_file',
+            field=models.FileField(blank=True, db_index=True, null=True, storage=prints.storage.stl_storage, upload_to='prints/stl_files/'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-19 14:38
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prints', '0006_stl_blobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='STLLayerProfile',
+            fields=[
+                ('blob', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='layer_profile', serialize=False, to='prints.stlblob')),
+                ('step_mm', models.FloatField()),
+                ('z_start_mm', models.FloatField()),
+                ('areas', models.BinaryField()),
+                ('perimeters', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'STL layer profile',
+            },
+        ),
+    ]
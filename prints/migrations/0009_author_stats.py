@@ -0,0 +1,51 @@
+# Generated by Django 4.2.7 on 2026-10-19 14:42
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+import django.db.models.deletion
+
+
+def backfill_author_stats(apps, schema_editor):
+    PrintItem = apps.get_model('prints', 'PrintItem')
+    AuthorStats = apps.get_model('prints', 'AuthorStats')
+    totals = (
+        PrintItem.objects.filter(status__in=['published', 'featured'])
+        .order_by()
+        .values('author_id')
+        .annotate(
+            prints_count=Count('pk'),
+            views_count=Sum('views_count'),
+            likes_count=Sum('likes_count'),
+            downloads_count=Sum('downloads_count'),
+        )
+    )
+    AuthorStats.objects.bulk_create(
+        [AuthorStats(user_id=row.pop('author_id'), **row) for row in totals], batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('prints', '0008_engagement_events'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='author_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('prints_count', models.PositiveIntegerField(default=0)),
+                ('views_count', models.PositiveIntegerField(default=0)),
+                ('likes_count', models.PositiveIntegerField(default=0)),
+                ('downloads_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Author stats',
+            },
+        ),
+        migrations.RunPython(backfill_author_stats, migrations.RunPython.noop),
+    ]
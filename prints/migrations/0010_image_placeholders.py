@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-19 14:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prints', '0009_author_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='printimage',
+            name='color',
+            field=models.CharField(blank=True, editable=False, max_length=7),
+        ),
+        migrations.AddField(
+            model_name='printimage',
+            name='placeholder',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='printitem',
+            name='main_image_color',
+            field=models.CharField(blank=True, editable=False, max_length=7),
+        ),
+        migrations.AddField(
+            model_name='printitem',
+            name='main_image_placeholder',
+            field=models.TextField(blank=True, editable=False),
+        ),
+    ]
@@ -1,6 +1,15 @@
-from django.db import models
+import uuid
+
+from django.db import connection, models, transaction
+from django.db.models import Case, Count, F, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce, Greatest, Now
 from django.contrib.auth.models import User
 from django.urls import reverse
+from django.utils import timezone
+
+from .images import DERIVATIVE_WIDTHS, derivative_name, placeholder_for, store_derivatives
+from .signals import print_items_bulk_updated
+from .storage import ContentAddressedStorage, stl_storage
 
 
 class Category(models.Model):
@@ -21,6 +30,47 @@ class Category(models.Model):
         return reverse('prints:category_detail', kwargs={'slug': self.slug})
 
 
+class PrintItemQuerySet(models.QuerySet):
+    """Set-based bulk operations; each issues a single UPDATE for the whole selection"""
+
+    def _bulk_update(self, touch=True, **values):
+        """UPDATE the selection; ``touch`` stamps updated_at, which update() skips"""
+        pks = list(self.values_list('pk', flat=True))
+        if not pks:
+            return 0
+        if touch:
+            # Sitemaps take lastmod and Last-Modified from updated_at
+            values['updated_at'] = Now()
+        updated = PrintItem.objects.filter(pk__in=pks).update(**values)
+        print_items_bulk_updated.send(sender=PrintItem, pks=pks, fields=list(values))
+        return updated
+
+    def publish(self, status='published'):
+        # Keep the original publish date when re-publishing
+        return self._bulk_update(status=status, published_at=Coalesce(F('published_at'), Now()))
+
+    def feature(self):
+        return self.publish(status='featured')
+
+    def unpublish(self):
+        return self._bulk_update(status='draft')
+
+    def recategorize(self, category):
+        return self._bulk_update(category=category)
+
+    def recount(self):
+        """Recompute likes_count from PrintLike rows"""
+        likes = (
+            PrintLike.objects.filter(print_item=OuterRef('pk'))
+            .order_by()
+            .values('print_item')
+            .annotate(total=Count('pk'))
+            .values('total')
+        )
+        # A counter change is not a content change, so lastmod stays put
+        return self._bulk_update(touch=False, likes_count=Coalesce(Subquery(likes), 0))
+
+
 class PrintItem(models.Model):
     """Model for individual 3D print items"""
     DIFFICULTY_CHOICES = [
@@ -30,13 +80,17 @@ class PrintItem(models.Model):
         ('expert', 'Expert'),
     ]
     
+    # Offered by the admin filter; filament_type itself stays free text
+    COMMON_FILAMENT_TYPES = ['PLA', 'PETG', 'ABS', 'ASA', 'TPU', 'Nylon', 'Resin']
+    
     STATUS_CHOICES = [
         ('draft', 'Draft'),
         ('published', 'Published'),
         ('featured', 'Featured'),
     ]
+    PUBLIC_STATUSES = ('published', 'featured')
     
-    title = models.CharField(max_length=200)
+    title = models.CharField(max_length=200, db_index=True)
     description = models.TextField()
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='prints')
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='prints')
@@ -44,14 +98,22 @@ class PrintItem(models.Model):
     # Print specifications
     difficulty = models.CharField(max_length=20, choices=DIFFICULTY_CHOICES, default='beginner')
     print_time_hours = models.PositiveIntegerField(help_text="Estimated print time in hours")
-    filament_type = models.CharField(max_length=50, default='PLA')
+    filament_type = models.CharField(max_length=50, default='PLA', db_index=True)
     filament_amount_grams = models.PositiveIntegerField(help_text="Amount of filament needed in grams")
     layer_height = models.DecimalField(max_digits=3, decimal_places=2, default=0.20, help_text="Layer height in mm")
     infill_percentage = models.PositiveIntegerField(default=20, help_text="Infill percentage")
     
     # Media
-    main_image = models.ImageField(upload_to='prints/images/', blank=True, null=True)
-    stl_file = models.FileField(upload_to='prints/stl_files/', blank=True, null=True)
+    # Indexed so media requests can be authorized by file name
+    main_image = models.ImageField(upload_to='prints/images/', blank=True, null=True, db_index=True)
+    # Inlined by the card templates while the image loads (see prints.images)
+    main_image_placeholder = models.TextField(blank=True, editable=False)
+    main_image_color = models.CharField(max_length=7, blank=True, editable=False)
+    # Content-addressed: identical uploads share one file (see STLBlob)
+    stl_file = models.FileField(
+        upload_to='prints/stl_files/', storage=stl_storage, blank=True, null=True, db_index=True,
+    )
+    stl_sha256 = models.CharField(max_length=64, blank=True, db_index=True, editable=False)
     
     # Metadata
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='draft')
@@ -60,16 +122,57 @@ class PrintItem(models.Model):
     downloads_count = models.PositiveIntegerField(default=0)
     
     # Timestamps
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
     updated_at = models.DateTimeField(auto_now=True)
     published_at = models.DateTimeField(blank=True, null=True)
     
+    objects = PrintItemQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-created_at']
     
     def __str__(self):
         return self.title
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remembered so the STL reference count can follow changes on save
+        instance._stored_stl_sha256 = instance.__dict__.get('stl_sha256')
+        # Remembered so a change of author also refreshes the previous author's stats
+        instance._stored_author_id = instance.__dict__.get('author_id')
+        # Remembered so the image placeholder is only rendered when the image changes
+        instance._stored_main_image = instance.__dict__.get('main_image')
+        return instance
+    
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        # Stamp the first publication
+        if self.status in self.PUBLIC_STATUSES and self.published_at is None:
+            self.published_at = timezone.now()
+            if update_fields is not None and 'status' in update_fields:
+                kwargs['update_fields'] = update_fields = {*update_fields, 'published_at'}
+        # Commit a new upload now so its content hash is known before the row is written
+        if self.stl_file and not self.stl_file._committed:
+            self.stl_file.save(self.stl_file.name, self.stl_file.file, save=False)
+        if 'stl_sha256' in self.__dict__:
+            if not self.stl_file:
+                self.stl_sha256 = ''
+            else:
+                # Files stored before content addressing keep their recorded hash
+                self.stl_sha256 = ContentAddressedStorage.sha256_from_name(self.stl_file.name) or self.stl_sha256
+            if update_fields is not None and 'stl_file' in update_fields:
+                kwargs['update_fields'] = update_fields = {*update_fields, 'stl_sha256'}
+        if 'main_image' in self.__dict__ and (update_fields is None or 'main_image' in update_fields):
+            image = self.main_image
+            if not image._committed or (image.name or None) != getattr(self, '_stored_main_image', None):
+                self.main_image_placeholder, self.main_image_color = placeholder_for(image)
+                if update_fields is not None:
+                    kwargs['update_fields'] = {*update_fields, 'main_image_placeholder', 'main_image_color'}
+        super().save(*args, **kwargs)
+        if 'main_image' in self.__dict__:
+            self._stored_main_image = self.main_image.name or None
+    
     def get_absolute_url(self):
         return reverse('prints:print_detail', kwargs={'pk': self.pk})
     
@@ -84,18 +187,64 @@ class PrintItem(models.Model):
         return colors.get(self.difficulty, 'secondary')
 
 
+class PrintImageQuerySet(models.QuerySet):
+    def reorder(self, orders):
+        """Apply ``{pk: order}`` to the selection in a single UPDATE"""
+        if not orders:
+            return 0
+        return self.filter(pk__in=orders).update(order=Case(
+            *[When(pk=pk, then=Value(order)) for pk, order in orders.items()],
+            default=F('order'),
+            output_field=models.PositiveIntegerField(),
+        ))
+
+
 class PrintImage(models.Model):
     """Model for additional images of print items"""
     print_item = models.ForeignKey(PrintItem, on_delete=models.CASCADE, related_name='images')
-    image = models.ImageField(upload_to='prints/gallery/')
+    image = models.ImageField(upload_to='prints/gallery/', db_index=True)
     caption = models.CharField(max_length=200, blank=True)
     order = models.PositiveIntegerField(default=0)
+    # Inlined by the gallery while the image loads (see prints.images)
+    placeholder = models.TextField(blank=True, editable=False)
+    color = models.CharField(max_length=7, blank=True, editable=False)
+    
+    objects = PrintImageQuerySet.as_manager()
     
     class Meta:
         ordering = ['order']
     
     def __str__(self):
         return f"{self.print_item.title} - Image {self.order}"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._stored_image = instance.__dict__.get('image')
+        return instance
+    
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        changed = False
+        if 'image' in self.__dict__ and (update_fields is None or 'image' in update_fields):
+            changed = not self.image._committed or (self.image.name or None) != getattr(self, '_stored_image', None)
+            if changed:
+                self.placeholder, self.color = placeholder_for(self.image)
+                if update_fields is not None:
+                    kwargs['update_fields'] = {*update_fields, 'placeholder', 'color'}
+        super().save(*args, **kwargs)
+        if 'image' in self.__dict__:
+            self._stored_image = self.image.name or None
+        # Only files that could be summarized are worth resizing
+        if changed and self.placeholder:
+            store_derivatives(self.image)
+    
+    def derivative_urls(self):
+        """``{width: url}`` of the resized copies; missing ones are served from the source"""
+        return {
+            width: self.image.storage.url(derivative_name(self.image.name, width))
+            for width in DERIVATIVE_WIDTHS
+        }
 
 
 class PrintComment(models.Model):
@@ -103,7 +252,7 @@ class PrintComment(models.Model):
     print_item = models.ForeignKey(PrintItem, on_delete=models.CASCADE, related_name='comments')
     author = models.ForeignKey(User, on_delete=models.CASCADE)
     content = models.TextField()
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
@@ -117,10 +266,276 @@ class PrintLike(models.Model):
     """Model for likes on print items"""
     print_item = models.ForeignKey(PrintItem, on_delete=models.CASCADE, related_name='likes')
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
     
     class Meta:
         unique_together = ['print_item', 'user']
     
     def __str__(self):
         return f"{self.user.username} likes {self.print_item.title}"
+
+
+class STLUpload(models.Model):
+    """Chunked, resumable upload of an STL file for a print item"""
+    STATUS_CHOICES = [
+        ('uploading', 'Uploading'),
+        ('complete', 'Complete'),
+        ('failed', 'Failed'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    print_item = models.ForeignKey(PrintItem, on_delete=models.CASCADE, related_name='stl_uploads')
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField(help_text="Total size in bytes")
+    offset = models.PositiveBigIntegerField(default=0, help_text="Bytes received so far")
+    expected_sha256 = models.CharField(max_length=64, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='uploading')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.size})"
+
+
+
+class STLBlobManager(models.Manager):
+    def register(self, sha256, name, stats=None, measure=False):
+        """Return the blob for ``sha256``, creating its row the first time it is seen
+        
+        ``stats`` is the file's mesh_stats() when the caller has already measured
+        it; otherwise ``measure`` reads the mesh once, for new content only, so
+        near-duplicates can be looked up right away. Blobs registered with
+        neither are measured later by rebuild_stl_blobs.
+        """
+        blob = self.filter(pk=sha256).first()
+        if blob is not None:
+            return blob
+        if stats is None and measure:
+            stats = self.measure(name)
+        defaults = {'name': name, **self.stats_fields(stats)}
+        try:
+            defaults['size'] = stl_storage().size(name)
+        except OSError:
+            pass
+        blob, _ = self.get_or_create(pk=sha256, defaults=defaults)
+        return blob
+    
+    def measure(self, name):
+        """mesh_stats() of a stored STL, or None when it cannot be read"""
+        from .stl import STLError, load_stl, mesh_stats
+        
+        try:
+            return mesh_stats(load_stl(stl_storage().path(name)))
+        except (OSError, STLError):
+            return None
+    
+    def stats_fields(self, stats):
+        """Model fields for a mesh_stats() result"""
+        if not stats:
+            return {}
+        from .stl import fingerprint
+        
+        return {
+            'triangle_count': stats['triangle_count'],
+            'volume_mm3': stats['volume_mm3'],
+            'surface_area_mm2': stats['surface_area_mm2'],
+            'bbox_x_mm': stats['bbox_mm'][0],
+            'bbox_y_mm': stats['bbox_mm'][1],
+            'bbox_z_mm': stats['bbox_mm'][2],
+            'fingerprint': fingerprint(stats),
+        }
+    
+    def retain(self, sha256, name, count=1, stats=None, measure=False):
+        """Add ``count`` references, creating the blob row if needed"""
+        self.register(sha256, name, stats, measure)
+        self.filter(pk=sha256).update(ref_count=F('ref_count') + count)
+    
+    def release(self, sha256, count=1):
+        """Drop ``count`` references; the file is deleted with its last reference"""
+        with transaction.atomic():
+            blob = self.select_for_update().filter(pk=sha256).first()
+            if blob is None:
+                return
+            blob.ref_count = max(blob.ref_count - count, 0)
+            if blob.ref_count:
+                blob.save(update_fields=['ref_count'])
+                return
+            blob.delete()
+            transaction.on_commit(lambda: stl_storage().delete(blob.name))
+
+
+class STLBlob(models.Model):
+    """One stored STL file, shared by every PrintItem with the same content"""
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    name = models.CharField(max_length=255, help_text="Storage name of the file")
+    size = models.PositiveBigIntegerField(default=0)
+    ref_count = models.PositiveIntegerField(default=0)
+    
+    # Mesh statistics (mm); empty when the file could not be parsed
+    triangle_count = models.PositiveIntegerField(default=0)
+    volume_mm3 = models.FloatField(default=0)
+    surface_area_mm2 = models.FloatField(default=0)
+    bbox_x_mm = models.FloatField(default=0)
+    bbox_y_mm = models.FloatField(default=0)
+    bbox_z_mm = models.FloatField(default=0)
+    fingerprint = models.CharField(max_length=64, blank=True, db_index=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    objects = STLBlobManager()
+    
+    class Meta:
+        verbose_name = "STL blob"
+    
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.ref_count} refs)"
+    
+    def similar_prints(self):
+        """Prints whose STL is this file or a near-duplicate mesh"""
+        hashes = [self.sha256]
+        if self.fingerprint:
+            hashes = STLBlob.objects.filter(fingerprint=self.fingerprint).values('sha256')
+        return PrintItem.objects.filter(stl_sha256__in=hashes)
+
+
+class STLLayerProfile(models.Model):
+    """Cross-section area and perimeter of an STL sampled along Z (see prints.estimator)"""
+    blob = models.OneToOneField(STLBlob, on_delete=models.CASCADE, primary_key=True, related_name='layer_profile')
+    step_mm = models.FloatField()
+    z_start_mm = models.FloatField()
+    # Little-endian float32 arrays, one value per sample
+    areas = models.BinaryField()
+    perimeters = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = "STL layer profile"
+    
+    def __str__(self):
+        return f"{self.blob_id[:12]} @ {self.step_mm}mm"
+
+
+class EngagementEvent(models.Model):
+    """Append-only log of engagement, written in batches by prints.events"""
+    KIND_CHOICES = [
+        ('view', 'View'),
+        ('like', 'Like'),
+        ('unlike', 'Unlike'),
+        ('comment', 'Comment'),
+        ('download', 'Download'),
+    ]
+    
+    id = models.BigAutoField(primary_key=True)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    # No FK constraint: the log must accept inserts without locking prints
+    print_item = models.ForeignKey(
+        PrintItem, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+'
+    )
+    user = models.ForeignKey(
+        User, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='+'
+    )
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+    
+    class Meta:
+        ordering = ['-id']
+    
+    def __str__(self):
+        return f"{self.kind} of print {self.print_item_id} at {self.created_at:%Y-%m-%d %H:%M}"
+
+
+class DailyEngagement(models.Model):
+    """Per-print, per-day engagement totals rolled up from EngagementEvent"""
+    date = models.DateField()
+    print_item = models.ForeignKey(
+        PrintItem, on_delete=models.CASCADE, db_constraint=False, related_name='daily_engagement'
+    )
+    views = models.PositiveIntegerField(default=0)
+    likes = models.PositiveIntegerField(default=0)
+    unlikes = models.PositiveIntegerField(default=0)
+    comments = models.PositiveIntegerField(default=0)
+    downloads = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        ordering = ['-date', 'print_item']
+        unique_together = ['date', 'print_item']
+        verbose_name_plural = "Daily engagement"
+    
+    def __str__(self):
+        return f"{self.print_item_id} on {self.date}"
+
+
+class RollupCursor(models.Model):
+    """Id of the last event folded into the rollups, per rollup job"""
+    name = models.CharField(max_length=50, primary_key=True)
+    last_event_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.name} @ {self.last_event_id}"
+
+
+class AuthorStatsManager(models.Manager):
+    COUNTERS = ('views_count', 'likes_count', 'downloads_count')
+    
+    def refresh(self, author_ids, batch_size=1000):
+        """Recompute the stats of ``author_ids`` from their public prints"""
+        author_ids = list(set(author_ids))
+        for start in range(0, len(author_ids), batch_size):
+            chunk = author_ids[start:start + batch_size]
+            rows = {pk: AuthorStats(user_id=pk) for pk in chunk}
+            totals = (
+                PrintItem.objects.filter(author_id__in=chunk, status__in=PrintItem.PUBLIC_STATUSES)
+                .order_by()
+                .values('author_id')
+                .annotate(
+                    prints_count=Count('pk'),
+                    **{field: models.Sum(field) for field in self.COUNTERS},
+                )
+            )
+            for row in totals:
+                for field, value in row.items():
+                    setattr(rows[row['author_id']], field, value)
+            
+            kwargs = {'update_conflicts': True, 'update_fields': ['prints_count', *self.COUNTERS, 'updated_at']}
+            if connection.features.supports_update_conflicts_with_target:
+                kwargs['unique_fields'] = ['user']
+            self.bulk_create(rows.values(), **kwargs)
+    
+    def bump(self, author_id, **deltas):
+        """Add ``deltas`` to one author's counters, creating the row if needed
+        
+        Counters are clamped at zero so an unlike or delete that races a
+        refresh cannot push a PositiveIntegerField below zero.
+        """
+        updated = self.filter(user_id=author_id).update(
+            **{field: Greatest(F(field) + delta, 0) for field, delta in deltas.items()}, updated_at=Now(),
+        )
+        if not updated:
+            self.refresh([author_id])
+
+
+class AuthorStats(models.Model):
+    """Precomputed totals over an author's public prints
+    
+    Counter changes are applied as increments (``bump``); anything that moves
+    prints in or out of the totals recomputes the author (``refresh``), and
+    ``rebuild_author_stats`` repairs every row in bulk.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='author_stats')
+    prints_count = models.PositiveIntegerField(default=0)
+    views_count = models.PositiveIntegerField(default=0)
+    likes_count = models.PositiveIntegerField(default=0)
+    downloads_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    objects = AuthorStatsManager()
+    
+    class Meta:
+        verbose_name_plural = "Author stats"
+    
+    def __str__(self):
+        return f"Stats for {self.user_id}"
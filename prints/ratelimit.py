@@ -0,0 +1,170 @@
+"""
+Token-bucket rate limiting for write endpoints.
+
+Every protected view has one bucket per user and one per client IP. A bucket
+holds up to ``burst`` tokens and refills at ``rate`` tokens per second; a
+request spends one token from each and is refused when either is empty:
+AJAX calls get 429 + Retry-After, plain form posts a flash message and a
+redirect back. Limits per scope come from ``settings.RATE_LIMITS``. State lives in process memory (a bounded LRU of
+buckets), so a check is a dict lookup and some arithmetic, with no database
+or cache round trip. With several workers the effective limit is per worker,
+which is still enough to stop scripts from piling writes onto hot rows.
+"""
+import logging
+import math
+import threading
+import time
+from collections import Counter, OrderedDict
+from functools import wraps
+
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.exceptions import ImproperlyConfigured
+from django.http import JsonResponse
+from django.shortcuts import redirect
+from django.utils.http import url_has_allowed_host_and_scheme
+
+
+logger = logging.getLogger(__name__)
+
+# Client IPs get IP_FACTOR times a user's limit because several users can share one address
+IP_FACTOR = 4
+
+
+class TokenBuckets:
+    """Bucket state for many keys, bounded to ``max_keys`` least recently used"""
+
+    def __init__(self, max_keys=100_000):
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()  # key -> [tokens, last_refill]
+        self.lock = threading.Lock()
+
+    def _bucket(self, key, rate, burst, now):
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = [float(burst), now]
+            if len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(key)
+            bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+        return bucket
+
+    def take(self, limits, now=None):
+        """Spend one token from every ``(key, rate, burst)`` bucket, all or none
+
+        Returns 0 when allowed, otherwise the seconds until all buckets have a token.
+        """
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            buckets = [(self._bucket(key, rate, burst, now), rate) for key, rate, burst in limits]
+            wait = max((1 - tokens) / rate for (tokens, _), rate in buckets)
+            if wait > 0:
+                return wait
+            for bucket, _ in buckets:
+                bucket[0] -= 1
+            return 0
+
+
+buckets = TokenBuckets()
+# Counts per (scope, outcome), outcome being 'allowed' or 'throttled'
+metrics = Counter()
+throttled_clients = Counter()
+MAX_TRACKED_CLIENTS = 10_000
+
+
+def client_ip(request):
+    if getattr(settings, 'RATE_LIMIT_TRUST_X_FORWARDED_FOR', False):
+        forwarded = request.headers.get('X-Forwarded-For', '')
+        if forwarded:
+            # The last hop is the address our own proxy saw
+            return forwarded.split(',')[-1].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def scope_limits():
+    """``{scope: (tokens per second, burst)}`` for a user, from settings.RATE_LIMITS"""
+    return settings.RATE_LIMITS
+
+
+def wants_json(request):
+    return (
+        request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+        or request.content_type == 'application/json'
+        or 'application/json' in request.headers.get('Accept', '')
+    )
+
+
+def throttled_response(request, retry_after):
+    """429 with Retry-After for AJAX calls; for form posts a message on the page they came from"""
+    if wants_json(request):
+        response = JsonResponse(
+            {'error': 'Too many requests, please slow down', 'retry_after': retry_after},
+            status=429,
+        )
+        response['Retry-After'] = retry_after
+        return response
+    messages.error(request, f'You are posting too fast. Please try again in {retry_after} seconds.')
+    referer = request.headers.get('Referer')
+    if referer and url_has_allowed_host_and_scheme(
+        referer, allowed_hosts={request.get_host()}, require_https=request.is_secure()
+    ):
+        return redirect(referer)
+    # Protected views redirect GETs to the page their form lives on
+    return redirect(request.path)
+
+
+def rate_limit(scope):
+    """Throttle POSTs to the decorated view per user and per client IP"""
+    if scope not in scope_limits():
+        raise ImproperlyConfigured(f'No rate limit configured for scope {scope!r} in RATE_LIMITS')
+
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if request.method != 'POST':
+                return view(request, *args, **kwargs)
+            rate, burst = scope_limits()[scope]
+            ip = client_ip(request)
+            limits = [(f'{scope}:ip:{ip}', rate * IP_FACTOR, burst * IP_FACTOR)]
+            if request.user.is_authenticated:
+                limits.append((f'{scope}:user:{request.user.pk}', rate, burst))
+
+            wait = buckets.take(limits)
+            if not wait:
+                metrics[scope, 'allowed'] += 1
+                return view(request, *args, **kwargs)
+
+            metrics[scope, 'throttled'] += 1
+            client = f'user {request.user.pk}' if request.user.is_authenticated else f'ip {ip}'
+            throttled_clients[scope, client] += 1
+            if len(throttled_clients) > MAX_TRACKED_CLIENTS:
+                # Keep the worst offenders, forget the long tail
+                kept = throttled_clients.most_common(MAX_TRACKED_CLIENTS // 10)
+                throttled_clients.clear()
+                throttled_clients.update(dict(kept))
+            logger.warning('Throttled %s on %s (%s)', client, scope, request.path)
+            return throttled_response(request, max(1, math.ceil(wait)))
+        return wrapped
+    return decorator
+
+
+@staff_member_required
+def rate_limit_metrics(request):
+    """Throttling counters of this worker process"""
+    return JsonResponse({
+        'scopes': {
+            scope: {
+                'allowed': metrics[scope, 'allowed'],
+                'throttled': metrics[scope, 'throttled'],
+            }
+            for scope in scope_limits()
+        },
+        'top_throttled': [
+            {'scope': scope, 'client': client, 'count': count}
+            for (scope, client), count in throttled_clients.most_common(20)
+        ],
+        'tracked_buckets': len(buckets.buckets),
+    })
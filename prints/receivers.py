@@ -0,0 +1,92 @@
+from django.contrib.auth.models import User
+from django.core.signals import request_finished
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import events, sitemaps
+from .models import AuthorStats, Category, PrintItem, STLBlob
+from .signals import print_items_bulk_updated
+
+
+# Fields whose change can move an author's totals
+AUTHOR_STATS_FIELDS = {'status', 'author', 'views_count', 'likes_count', 'downloads_count'}
+
+
+@receiver(post_save, sender=PrintItem)
+def track_stl_reference(sender, instance, created, **kwargs):
+    """Move the STL reference when a saved print points at different content"""
+    previous = '' if created else getattr(instance, '_stored_stl_sha256', None)
+    current = instance.__dict__.get('stl_sha256')
+    # Unknown on either side (deferred field, hand-built instance): leave counts alone
+    if previous is None or current is None or previous == current:
+        instance._stored_stl_sha256 = current
+        return
+    if current:
+        # Measured once per new content, so the admin can warn about near-duplicates
+        STLBlob.objects.retain(current, instance.stl_file.name, measure=True)
+    if previous:
+        STLBlob.objects.release(previous)
+    instance._stored_stl_sha256 = current
+
+
+@receiver(post_delete, sender=PrintItem)
+def release_stl_reference(sender, instance, **kwargs):
+    sha256 = instance.__dict__.get('stl_sha256')
+    if sha256:
+        STLBlob.objects.release(sha256)
+
+
+@receiver(post_save, sender=PrintItem)
+def refresh_author_stats(sender, instance, created, update_fields=None, **kwargs):
+    # Counter-only saves (views, likes) bump the stats themselves at the call site
+    if update_fields is not None and not {'status', 'author'} & set(update_fields):
+        return
+    authors = {instance.author_id, getattr(instance, '_stored_author_id', None)} - {None}
+    AuthorStats.objects.refresh(authors)
+    instance._stored_author_id = instance.author_id
+
+
+@receiver(post_delete, sender=PrintItem)
+def refresh_author_stats_on_delete(sender, instance, origin=None, **kwargs):
+    # Prints deleted along with their author take the stats row with them
+    if getattr(origin, 'model', type(origin)) is User:
+        return
+    AuthorStats.objects.refresh([instance.author_id])
+
+
+@receiver(print_items_bulk_updated)
+def refresh_author_stats_on_bulk_update(sender, pks, fields, **kwargs):
+    if AUTHOR_STATS_FIELDS & set(fields):
+        authors = PrintItem.objects.filter(pk__in=pks).values_list('author_id', flat=True).distinct()
+        AuthorStats.objects.refresh(authors)
+
+
+@receiver(post_save, sender=PrintItem)
+@receiver(post_delete, sender=PrintItem)
+def invalidate_print_sitemaps(sender, instance, update_fields=None, **kwargs):
+    # Counter updates do not touch updated_at, so the sitemap is unaffected
+    if update_fields is not None and set(update_fields) <= set(AuthorStats.objects.COUNTERS):
+        return
+    sitemaps.invalidate('prints', [sitemaps.shard_of(instance.pk)])
+    sitemaps.invalidate('categories', [sitemaps.shard_of(instance.category_id)])
+
+
+@receiver(print_items_bulk_updated)
+def invalidate_print_sitemaps_on_bulk_update(sender, pks, fields, **kwargs):
+    if set(fields) <= set(AuthorStats.objects.COUNTERS):
+        return
+    categories = PrintItem.objects.filter(pk__in=pks).values_list('category_id', flat=True).distinct()
+    sitemaps.invalidate('prints', {sitemaps.shard_of(pk) for pk in pks})
+    sitemaps.invalidate('categories', {sitemaps.shard_of(pk) for pk in categories})
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_sitemaps(sender, instance, **kwargs):
+    sitemaps.invalidate('categories', [sitemaps.shard_of(instance.pk)])
+
+
+@receiver(request_finished)
+def flush_engagement_events(sender, **kwargs):
+    """Write buffered events that have waited long enough, even when traffic is low"""
+    events.buffer.flush_if_due()
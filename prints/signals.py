@@ -0,0 +1,6 @@
+from django.dispatch import Signal
+
+
+# Sent after a set-based UPDATE on PrintItem rows, which bypasses save() and
+# post_save. Receivers get ``pks`` (list of affected ids) and ``fields``.
+print_items_bulk_updated = Signal()
@@ -0,0 +1,221 @@
+"""
+Sharded, streaming sitemaps.
+
+Each section (prints, categories) is split into shards by primary-key range,
+``[shard * SHARD_SIZE, (shard + 1) * SHARD_SIZE)``, so a shard is read with
+one index range scan and no OFFSET or COUNT. A cold shard is streamed to the
+client while it is generated from a chunked iterator, and the finished body is
+cached together with its lastmod.
+
+Cache keys carry a per-shard version. Saving or deleting a print bumps only
+the version of the shard it lives in (plus the index), so unchanged shards
+keep being served from the cache.
+"""
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max, Q
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
+from .models import Category, PrintItem
+
+
+SHARD_SIZE = getattr(settings, 'SITEMAP_SHARD_SIZE', 10000)
+CHUNK_SIZE = 2000
+CACHE_TIMEOUT = 24 * 60 * 60
+CONTENT_TYPE = 'application/xml; charset=utf-8'
+
+XML_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n'
+URLSET_OPEN = '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+INDEX_OPEN = '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+
+
+class Section:
+    """One kind of page listed in the sitemap"""
+    name = None
+    model = None
+
+    def queryset(self):
+        raise NotImplementedError
+
+    def shard_count(self):
+        last_pk = self.queryset().aggregate(last=Max('pk'))['last']
+        return 0 if last_pk is None else last_pk // SHARD_SIZE + 1
+
+    def shard_queryset(self, shard):
+        return self.queryset().filter(pk__gte=shard * SHARD_SIZE, pk__lt=(shard + 1) * SHARD_SIZE)
+
+    def lastmod(self, shard):
+        raise NotImplementedError
+
+    def entries(self, shard):
+        """Yield ``(path, lastmod)`` for every page in the shard"""
+        raise NotImplementedError
+
+
+class PrintSection(Section):
+    name = 'prints'
+    model = PrintItem
+
+    def queryset(self):
+        return PrintItem.objects.filter(status__in=PrintItem.PUBLIC_STATUSES).order_by()
+
+    def lastmod(self, shard):
+        return self.shard_queryset(shard).aggregate(lastmod=Max('updated_at'))['lastmod']
+
+    def entries(self, shard):
+        rows = self.shard_queryset(shard).order_by('pk').values_list('pk', 'updated_at')
+        for pk, updated_at in rows.iterator(chunk_size=CHUNK_SIZE):
+            yield reverse('prints:print_detail', kwargs={'pk': pk}), updated_at
+
+
+class CategorySection(Section):
+    name = 'categories'
+    model = Category
+    # A category page changes when one of its public prints does
+    public_prints = Q(prints__status__in=PrintItem.PUBLIC_STATUSES)
+
+    def queryset(self):
+        return Category.objects.order_by()
+
+    def lastmod(self, shard):
+        return self.shard_queryset(shard).aggregate(lastmod=Max('prints__updated_at', filter=self.public_prints))['lastmod']
+
+    def entries(self, shard):
+        rows = (
+            self.shard_queryset(shard)
+            .annotate(lastmod=Max('prints__updated_at', filter=self.public_prints))
+            .order_by('pk')
+            .values_list('slug', 'lastmod')
+        )
+        for slug, lastmod in rows.iterator(chunk_size=CHUNK_SIZE):
+            yield reverse('prints:category_detail', kwargs={'slug': slug}), lastmod
+
+
+SECTIONS = {section.name: section for section in (PrintSection(), CategorySection())}
+
+
+def shard_of(pk):
+    return pk // SHARD_SIZE
+
+
+def version_key(section, shard=None):
+    return f'sitemap:{section}:{"index" if shard is None else shard}:version'
+
+
+def get_version(section, shard=None):
+    return cache.get_or_set(version_key(section, shard), 1, None)
+
+
+def invalidate(section, shards):
+    """Drop the cached copies of ``shards`` of ``section`` (and of the index)"""
+    keys = [version_key(section, shard) for shard in set(shards)] + [version_key('all')]
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            pass  # Never cached under this version, nothing to drop
+
+
+def invalidate_section(section):
+    """Drop every cached shard of ``section``, e.g. after a bulk import"""
+    invalidate(section, range(SECTIONS[section].shard_count()))
+
+
+def shard_lastmod(section, shard):
+    key = f'sitemap:{section.name}:{shard}:v{get_version(section.name, shard)}:lastmod'
+    lastmod = cache.get(key)
+    if lastmod is None:
+        lastmod = section.lastmod(shard) or ''
+        cache.set(key, lastmod, CACHE_TIMEOUT)
+    return lastmod or None
+
+
+def url_entry(root, path, lastmod):
+    entry = f'<url><loc>{escape(root + path)}</loc>'
+    if lastmod:
+        entry += f'<lastmod>{lastmod.date().isoformat()}</lastmod>'
+    return entry + '</url>\n'
+
+
+def batched(lines, size=500):
+    """Join small lines into larger chunks so streaming does not write per URL"""
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= size:
+            yield ''.join(batch)
+            batch = []
+    if batch:
+        yield ''.join(batch)
+
+
+def cached_stream(key, chunks):
+    """Yield ``chunks`` and cache their concatenation once the stream completes"""
+    body = []
+    for chunk in chunks:
+        body.append(chunk)
+        yield chunk
+    cache.set(key, ''.join(body), CACHE_TIMEOUT)
+
+
+def respond(request, key, lastmod, generate):
+    """Serve a cached body, or stream and cache a freshly generated one"""
+    last_modified = int(lastmod.timestamp()) if lastmod else None
+    response = get_conditional_response(request, last_modified=last_modified)
+    if response is None:
+        body = cache.get(key)
+        if body is not None:
+            response = HttpResponse(body, content_type=CONTENT_TYPE)
+        else:
+            response = StreamingHttpResponse(cached_stream(key, batched(generate())), content_type=CONTENT_TYPE)
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+@require_safe
+def sitemap_index(request):
+    root = request.build_absolute_uri('/').rstrip('/')
+    key = f'sitemap:index:v{get_version("all")}:{root}'
+
+    def generate():
+        yield XML_HEADER + INDEX_OPEN
+        for section in SECTIONS.values():
+            for shard in range(section.shard_count()):
+                lastmod = shard_lastmod(section, shard)
+                if lastmod is None and not section.shard_queryset(shard).exists():
+                    continue
+                path = reverse('prints:sitemap_section', kwargs={'section': section.name, 'shard': shard})
+                entry = f'<sitemap><loc>{escape(root + path)}</loc>'
+                if lastmod:
+                    entry += f'<lastmod>{lastmod.isoformat()}</lastmod>'
+                yield entry + '</sitemap>\n'
+        yield '</sitemapindex>\n'
+
+    return respond(request, key, None, generate)
+
+
+@require_safe
+def sitemap_section(request, section, shard):
+    section = SECTIONS.get(section)
+    if section is None:
+        raise Http404
+    root = request.build_absolute_uri('/').rstrip('/')
+    key = f'sitemap:{section.name}:{shard}:v{get_version(section.name, shard)}:{root}'
+    lastmod = shard_lastmod(section, shard)
+    if lastmod is None and not section.shard_queryset(shard).exists():
+        raise Http404
+
+    def generate():
+        yield XML_HEADER + URLSET_OPEN
+        for path, updated_at in section.entries(shard):
+            yield url_entry(root, path, updated_at)
+        yield '</urlset>\n'
+
+    return respond(request, key, lastmod, generate)
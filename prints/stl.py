@@ -0,0 +1,110 @@
+"""
+STL parsing and mesh statistics.
+
+Binary and ASCII STL files are loaded into an ``(n, 3, 3)`` float array of
+triangle vertices so every statistic is a vectorized NumPy expression.
+"""
+import hashlib
+import math
+import re
+
+import numpy as np
+
+
+BINARY_HEADER_SIZE = 80
+BINARY_TRIANGLE_DTYPE = np.dtype([
+    ('normal', '<f4', (3,)),
+    ('vertices', '<f4', (3, 3)),
+    ('attributes', '<u2'),
+])
+ASCII_VERTEX_RE = re.compile(rb'vertex\s+(\S+)\s+(\S+)\s+(\S+)')
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Quantization of the scale-free shape ratios in a fingerprint
+FINGERPRINT_STEP = 0.02
+
+
+class STLError(ValueError):
+    """Raised for files that are not valid STL meshes"""
+
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def parse_stl(data):
+    """Return the triangles of an STL file as an ``(n, 3, 3)`` float64 array"""
+    if len(data) >= BINARY_HEADER_SIZE + 4:
+        count = int(np.frombuffer(data, '<u4', 1, BINARY_HEADER_SIZE)[0])
+        if len(data) == BINARY_HEADER_SIZE + 4 + count * BINARY_TRIANGLE_DTYPE.itemsize:
+            records = np.frombuffer(data, BINARY_TRIANGLE_DTYPE, count, BINARY_HEADER_SIZE + 4)
+            return records['vertices'].astype(np.float64)
+
+    # Binary files may also start with "solid", so size is checked first
+    if not data.lstrip()[:5].lower() == b'solid':
+        raise STLError('Not a binary or ASCII STL file')
+    vertices = ASCII_VERTEX_RE.findall(data)
+    if not vertices or len(vertices) % 3:
+        raise STLError('ASCII STL has no complete facets')
+    try:
+        return np.array(vertices, dtype=np.float64).reshape(-1, 3, 3)
+    except ValueError as exc:
+        raise STLError(f'Malformed vertex: {exc}')
+
+
+def load_stl(path):
+    with open(path, 'rb') as f:
+        return parse_stl(f.read())
+
+
+def mesh_stats(triangles):
+    """Volume, area, bounding box and triangle count of a closed mesh (mm units)"""
+    v0, v1, v2 = triangles[:, 0], triangles[:, 1], triangles[:, 2]
+    cross = np.cross(v1 - v0, v2 - v0)
+    # Divergence theorem: sum of signed tetrahedron volumes against the origin
+    volume = abs(np.einsum('ij,ij->i', v0, np.cross(v1, v2)).sum()) / 6.0
+    area = np.linalg.norm(cross, axis=1).sum() / 2.0
+    points = triangles.reshape(-1, 3)
+    lower = points.min(axis=0)
+    upper = points.max(axis=0)
+    return {
+        'triangle_count': int(len(triangles)),
+        'volume_mm3': float(volume),
+        'surface_area_mm2': float(area),
+        'bbox_mm': [float(d) for d in upper - lower],
+    }
+
+
+def analyze_stl(path):
+    """Hash and measure one STL file; safe to run in a worker process"""
+    stats = mesh_stats(load_stl(path))
+    stats['sha256'] = sha256_file(path)
+    return stats
+
+
+def fingerprint(stats):
+    """Scale- and orientation-tolerant key shared by near-identical meshes
+
+    Built from ratios that survive re-export, uniform scaling and axis swaps:
+    sorted bounding-box proportions, how much of the box the volume fills,
+    normalized surface area, and the triangle count in half-octave buckets.
+    Equal keys are found by an index lookup instead of comparing meshes.
+    """
+    a, b, c = sorted(stats['bbox_mm'])
+    if c <= 0:
+        return ''
+    box_volume = a * b * c
+    box_area = 2 * (a * b + b * c + c * a)
+    ratios = [
+        a / c,
+        b / c,
+        stats['volume_mm3'] / box_volume if box_volume else 0.0,
+        stats['surface_area_mm2'] / box_area if box_area else 0.0,
+    ]
+    triangles = int(math.log2(max(stats['triangle_count'], 1)) * 2)
+    return ':'.join([str(triangles)] + [str(round(r / FINGERPRINT_STEP)) for r in ratios])
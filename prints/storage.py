@@ -0,0 +1,144 @@
+import gzip
+import hashlib
+import os
+import posixpath
+import re
+import shutil
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile, File
+from django.core.files.storage import FileSystemStorage
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always produced
+    brotli = None
+
+
+# Extensions worth precompressing; images and fonts are already compressed
+COMPRESSIBLE_EXTENSIONS = {
+    '.css', '.js', '.mjs', '.map', '.json', '.svg', '.txt', '.html', '.xml', '.ico',
+}
+
+# Encodings in order of preference, mapped to the suffix of the variant file
+ENCODING_SUFFIXES = [('br', '.br'), ('gzip', '.gz')]
+
+
+def _gzip(content):
+    return gzip.compress(content, compresslevel=9, mtime=0)
+
+
+def _brotli(content):
+    return brotli.compress(content, quality=11)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Manifest storage that also writes .gz and .br variants at collectstatic time"""
+    min_compress_size = 256
+
+    def post_process(self, paths, dry_run=False, **options):
+        processed = []
+        for name, hashed_name, result in super().post_process(paths, dry_run, **options):
+            if not isinstance(result, Exception) and hashed_name:
+                processed.append((name, hashed_name))
+            yield name, hashed_name, result
+
+        if dry_run:
+            return
+
+        # Compress both the original and the hashed copy so unhashed
+        # references (e.g. from admin JS) also get an encoded variant
+        names = set()
+        for name, hashed_name in processed:
+            names.add(name)
+            names.add(hashed_name)
+        names.add(self.manifest_name)
+
+        for name in sorted(names):
+            for variant in self.compress_file(name):
+                yield name, variant, True
+
+    def compress_file(self, name):
+        """Write the compressed variants of ``name`` and return their names"""
+        if os.path.splitext(name)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+            return []
+        if not self.exists(name):
+            return []
+
+        with self.open(name) as original:
+            content = original.read()
+        if len(content) < self.min_compress_size:
+            return []
+
+        compressors = [('.gz', _gzip)]
+        if brotli is not None:
+            compressors.insert(0, ('.br', _brotli))
+
+        written = []
+        for suffix, compress in compressors:
+            compressed = compress(content)
+            # Only keep the variant if it actually saves bytes
+            if len(compressed) >= len(content):
+                continue
+            variant_name = name + suffix
+            if self.exists(variant_name):
+                self.delete(variant_name)
+            self._save(variant_name, ContentFile(compressed))
+            written.append(variant_name)
+        return written
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Stores each distinct file once, named by its SHA-256
+
+    ``prints/stl_files/model.stl`` is saved as ``prints/stl_files/ab/<sha256>.stl``;
+    saving identical content again returns the existing name without writing.
+    """
+    hashed_name_re = re.compile(r'/[0-9a-f]{2}/([0-9a-f]{64})\.[^/]*$')
+
+    def hashed_name(self, name, sha256):
+        directory, filename = posixpath.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        return posixpath.join(directory, sha256[:2], f'{sha256}{extension}')
+
+    @classmethod
+    def sha256_from_name(cls, name):
+        """Return the hash encoded in a content-addressed name, or ''"""
+        match = cls.hashed_name_re.search(name or '')
+        return match.group(1) if match else ''
+
+    def save(self, name, content, max_length=None):
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+
+        name = self.hashed_name(self.generate_filename(name), digest.hexdigest())
+        if self.exists(name):
+            return name
+        return self._save(name, content)
+
+    def adopt(self, path, name, sha256, move=False):
+        """Place an already-hashed local file; returns its content-addressed name"""
+        name = self.hashed_name(self.generate_filename(name), sha256)
+        destination = self.path(name)
+        if os.path.exists(destination):
+            if move:
+                os.remove(path)
+            return name
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        if move:
+            os.replace(path, destination)
+        else:
+            shutil.copyfile(path, destination)
+        return name
+
+
+stl_storage_instance = ContentAddressedStorage()
+
+
+def stl_storage():
+    """Callable storage for PrintItem.stl_file (keeps the instance out of migrations)"""
+    return stl_storage_instance
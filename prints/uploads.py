@@ -0,0 +1,287 @@
+"""
+Chunked, resumable STL uploads.
+
+The protocol is loosely modelled on tus:
+
+    POST   /uploads/stl/        {"print_id", "filename", "size", "sha256"?}  -> 201 session
+    GET    /uploads/stl/<id>/   current offset, to resume after a failure
+    PATCH  /uploads/stl/<id>/   raw chunk bytes, ``Upload-Offset`` header   -> new offset
+    DELETE /uploads/stl/<id>/   abandon the upload
+
+Chunks are streamed straight from the request to a temp file while being
+hashed, so no request buffers a whole file and each one is short. When the
+last chunk arrives the SHA-256 is checked and the temp file is renamed into
+MEDIA_ROOT, so the finished file is never copied or read again.
+"""
+import hashlib
+import json
+import os
+import tempfile
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.db import transaction
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.text import get_valid_filename
+from django.views.decorators.http import require_http_methods, require_POST
+
+from .models import PrintItem, STLBlob, STLUpload
+from .storage import stl_storage
+
+
+READ_BLOCK_SIZE = 256 * 1024
+
+
+class HasherCache:
+    """SHA-256 state of in-flight uploads held by this process (bounded LRU)
+
+    hashlib objects cannot be persisted, so each worker keeps its own. When a
+    chunk lands on a worker whose hasher is behind (other workers took the
+    chunks in between), only the missing gap is read back from disk.
+    """
+
+    def __init__(self, max_entries=128):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+
+    def take(self, upload_id, path, offset):
+        """Remove and return a hasher that has consumed exactly ``offset`` bytes of ``path``"""
+        hasher, position = self.entries.pop(upload_id, (None, 0))
+        if hasher is None or position > offset:
+            hasher, position = hashlib.sha256(), 0
+        if position < offset:
+            with open(path, 'rb') as f:
+                f.seek(position)
+                remaining = offset - position
+                while remaining > 0:
+                    data = f.read(min(READ_BLOCK_SIZE, remaining))
+                    if not data:
+                        break
+                    hasher.update(data)
+                    remaining -= len(data)
+        return hasher
+
+    def put(self, upload_id, hasher, offset):
+        self.entries[upload_id] = (hasher, offset)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+
+hashers = HasherCache()
+
+
+def temp_path(upload):
+    return os.path.join(settings.STL_UPLOAD_TEMP_DIR, f'{upload.pk}.part')
+
+
+def upload_state(upload):
+    return {
+        'id': str(upload.pk),
+        'url': reverse('prints:stl_upload_detail', kwargs={'pk': upload.pk}),
+        'offset': upload.offset,
+        'size': upload.size,
+        'chunk_size': settings.STL_UPLOAD_CHUNK_SIZE,
+        'status': upload.status,
+    }
+
+
+def can_upload(user, print_item):
+    return user.is_staff or user.pk == print_item.author_id
+
+
+def parse_payload(request):
+    if request.content_type == 'application/json':
+        try:
+            return json.loads(request.body or b'{}')
+        except ValueError:
+            return None
+    return request.POST
+
+
+@login_required
+@require_POST
+def stl_upload_create(request):
+    """Open an upload session for a print the user owns"""
+    data = parse_payload(request)
+    if not isinstance(data, dict):
+        return JsonResponse({'error': 'Expected a JSON object'}, status=400)
+
+    try:
+        print_id = int(data.get('print_id'))
+    except (TypeError, ValueError):
+        return JsonResponse({'error': 'print_id must be an integer'}, status=400)
+    print_item = get_object_or_404(PrintItem.objects.only('pk', 'author_id'), pk=print_id)
+    if not can_upload(request.user, print_item):
+        return JsonResponse({'error': 'You cannot upload files for this print'}, status=403)
+
+    filename = get_valid_filename(os.path.basename(str(data.get('filename', ''))))
+    if not filename.lower().endswith('.stl'):
+        return JsonResponse({'error': 'Only .stl files can be uploaded'}, status=400)
+    try:
+        size = int(data.get('size'))
+    except (TypeError, ValueError):
+        return JsonResponse({'error': 'size must be an integer'}, status=400)
+    if not 0 < size <= settings.STL_UPLOAD_MAX_SIZE:
+        return JsonResponse({'error': f'size must be between 1 and {settings.STL_UPLOAD_MAX_SIZE}'}, status=400)
+    expected_sha256 = str(data.get('sha256', '')).lower()
+    if expected_sha256 and len(expected_sha256) != 64:
+        return JsonResponse({'error': 'sha256 must be a hex digest'}, status=400)
+
+    upload = STLUpload.objects.create(
+        print_item=print_item,
+        user=request.user,
+        filename=filename,
+        size=size,
+        expected_sha256=expected_sha256,
+    )
+    os.makedirs(settings.STL_UPLOAD_TEMP_DIR, exist_ok=True)
+    open(temp_path(upload), 'wb').close()
+    return JsonResponse(upload_state(upload), status=201)
+
+
+@login_required
+@require_http_methods(['GET', 'HEAD', 'PATCH', 'DELETE'])
+def stl_upload_detail(request, pk):
+    if request.method == 'PATCH':
+        return receive_chunk(request, pk)
+
+    upload = get_object_or_404(STLUpload, pk=pk, user=request.user)
+    if request.method == 'DELETE':
+        if upload.status == 'uploading':
+            discard(upload)
+        return JsonResponse(upload_state(upload))
+    response = JsonResponse(upload_state(upload))
+    response['Upload-Offset'] = upload.offset
+    return response
+
+
+def chunk_error(upload, offset, length):
+    """Response rejecting a chunk the session cannot take at ``offset``, or None"""
+    if upload.status != 'uploading':
+        return JsonResponse({'error': f'Upload is {upload.status}', **upload_state(upload)}, status=409)
+    if offset != upload.offset:
+        return JsonResponse({'error': 'Offset mismatch', **upload_state(upload)}, status=409)
+    if offset + length > upload.size:
+        return JsonResponse({'error': 'Chunk exceeds the declared size'}, status=413)
+    return None
+
+
+def receive_chunk(request, pk):
+    """Append one chunk at the session's current offset"""
+    try:
+        offset = int(request.headers['Upload-Offset'])
+        length = int(request.headers['Content-Length'])
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'Upload-Offset and Content-Length are required'}, status=400)
+    if length > settings.STL_UPLOAD_CHUNK_SIZE:
+        return JsonResponse({'error': 'Chunk too large'}, status=413)
+
+    upload = get_object_or_404(STLUpload, pk=pk, user=request.user)
+    error = chunk_error(upload, offset, length)
+    if error:
+        return error
+
+    # The body arrives at the client's pace, so it is staged in its own file
+    # with no transaction or row lock held; only appending it is serialized
+    fd, staged_path = tempfile.mkstemp(dir=settings.STL_UPLOAD_TEMP_DIR, prefix=f'{upload.pk}-', suffix='.chunk')
+    try:
+        chunk_hasher = hashlib.sha256()
+        received = 0
+        with os.fdopen(fd, 'wb') as staged:
+            while received < length:
+                data = request.read(min(READ_BLOCK_SIZE, length - received))
+                if not data:
+                    break
+                staged.write(data)
+                chunk_hasher.update(data)
+                received += len(data)
+
+        if received != length:
+            return JsonResponse({'error': 'Incomplete chunk', **upload_state(upload)}, status=400)
+        checksum = request.headers.get('Upload-Checksum', '')
+        if checksum:
+            algorithm, _, digest = checksum.partition(' ')
+            if algorithm.lower() != 'sha256' or digest.lower() != chunk_hasher.hexdigest():
+                return JsonResponse(
+                    {'error': 'Chunk checksum mismatch', **upload_state(upload)},
+                    status=460, reason='Checksum Mismatch',
+                )
+
+        with transaction.atomic():
+            # Serializes concurrent chunks for the same session; another one may have landed meanwhile
+            upload = get_object_or_404(STLUpload.objects.select_for_update(), pk=pk, user=request.user)
+            error = chunk_error(upload, offset, length)
+            if error:
+                return error
+
+            path = temp_path(upload)
+            hasher = hashers.take(upload.pk, path, offset)
+            with open(staged_path, 'rb') as staged, open(path, 'r+b') as f:
+                f.seek(offset)
+                # Drop the tail of any earlier chunk that failed half-way
+                f.truncate()
+                while True:
+                    data = staged.read(READ_BLOCK_SIZE)
+                    if not data:
+                        break
+                    f.write(data)
+                    hasher.update(data)
+
+            upload.offset = offset + received
+            if upload.offset < upload.size:
+                upload.save(update_fields=['offset', 'updated_at'])
+                hashers.put(upload.pk, hasher, upload.offset)
+                response = JsonResponse(upload_state(upload))
+            else:
+                response = finalize(upload, hasher.hexdigest())
+    finally:
+        try:
+            os.remove(staged_path)
+        except FileNotFoundError:
+            pass
+
+    response['Upload-Offset'] = upload.offset
+    return response
+
+
+def finalize(upload, sha256):
+    """Verify the assembled file and move it onto the print item"""
+    if upload.expected_sha256 and upload.expected_sha256 != sha256:
+        discard(upload, status='failed')
+        return JsonResponse({'error': 'File checksum mismatch', **upload_state(upload)}, status=422)
+
+    # Content-addressed: a file someone already uploaded is reused, not stored twice
+    storage = stl_storage()
+    name = storage.adopt(temp_path(upload), f'prints/stl_files/{upload.filename}', sha256, move=True)
+
+    print_items = PrintItem.objects.filter(pk=upload.print_item_id)
+    previous = print_items.select_for_update().values_list('stl_sha256', flat=True).first()
+    print_items.update(stl_file=name, stl_sha256=sha256)
+    if previous != sha256:
+        # New content is measured here so the response can list near-duplicates
+        STLBlob.objects.retain(sha256, name, measure=True)
+        if previous:
+            STLBlob.objects.release(previous)
+
+    upload.status = 'complete'
+    upload.save(update_fields=['offset', 'status', 'updated_at'])
+    similar = STLBlob.objects.get(pk=sha256).similar_prints().exclude(pk=upload.print_item_id)
+    return JsonResponse({
+        **upload_state(upload),
+        'sha256': sha256,
+        'stl_url': reverse('prints:download_stl', kwargs={'pk': upload.print_item_id}),
+        'similar_prints': list(similar.values_list('pk', flat=True)[:10]),
+    })
+
+
+def discard(upload, status='failed'):
+    hashers.entries.pop(upload.pk, None)
+    try:
+        os.remove(temp_path(upload))
+    except FileNotFoundError:
+        pass
+    upload.status = status
+    upload.save(update_fields=['offset', 'status', 'updated_at'])
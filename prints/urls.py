@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import feeds, gallery, media, ratelimit, sitemaps, uploads, views
 
 app_name = 'prints'
 
@@ -7,7 +7,21 @@ urlpatterns = [
     path('', views.home, name='home'),
     path('prints/', views.print_list, name='print_list'),
     path('prints/<int:pk>/', views.print_detail, name='print_detail'),
+    path('prints/<int:pk>/estimate/', views.print_estimate, name='print_estimate'),
+    path('prints/<int:pk>/download/', media.download_stl, name='download_stl'),
     path('category/<slug:slug>/', views.category_detail, name='category_detail'),
+    path('authors/<str:username>/', views.author_detail, name='author_detail'),
     path('prints/<int:pk>/like/', views.like_print, name='like_print'),
     path('prints/<int:pk>/comment/', views.add_comment, name='add_comment'),
+    path('prints/<int:pk>/gallery/', gallery.gallery, name='gallery'),
+    path('prints/<int:pk>/gallery/order/', gallery.gallery_reorder, name='gallery_reorder'),
+    path('ratelimit/metrics/', ratelimit.rate_limit_metrics, name='rate_limit_metrics'),
+    path('uploads/stl/', uploads.stl_upload_create, name='stl_upload_create'),
+    path('uploads/stl/<uuid:pk>/', uploads.stl_upload_detail, name='stl_upload_detail'),
+    path('sitemap.xml', sitemaps.sitemap_index, name='sitemap_index'),
+    path('sitemap-<slug:section>-<int:shard>.xml', sitemaps.sitemap_section, name='sitemap_section'),
+    path('feeds/new/', feeds.LatestPrintsFeed(), name='feed_latest'),
+    path('feeds/new/atom/', feeds.LatestPrintsAtomFeed(), name='feed_latest_atom'),
+    path('feeds/featured/', feeds.FeaturedPrintsFeed(), name='feed_featured'),
+    path('feeds/featured/atom/', feeds.FeaturedPrintsAtomFeed(), name='feed_featured_atom'),
 ]
@@ -1,16 +1,23 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.contrib.auth.models import User
 from django.db.models import Q, Count
 from django.core.paginator import Paginator
 from django.http import JsonResponse
-from .models import PrintItem, Category, PrintComment, PrintLike
+from django.urls import reverse
+from django.views.decorators.http import require_GET
+from . import events, gallery
+from .ratelimit import rate_limit
+from .estimator import FILAMENT_DENSITIES, ProfilePending, estimate, get_profile
+from .models import AuthorStats, PrintItem, Category, PrintComment, PrintLike
+from .stl import STLError
 
 
 def home(request):
     """Home page with featured prints and categories"""
-    featured_prints = PrintItem.objects.filter(status='featured')[:6]
-    recent_prints = PrintItem.objects.filter(status='published')[:6]
+    featured_prints = PrintItem.objects.filter(status='featured').select_related('category')[:6]
+    recent_prints = PrintItem.objects.filter(status='published').select_related('category')[:6]
     categories = Category.objects.annotate(print_count=Count('prints')).order_by('-print_count')[:8]
     
     context = {
@@ -76,20 +83,39 @@ def print_list(request):
 
 def print_detail(request, pk):
     """Detail view for a specific print item"""
-    print_item = get_object_or_404(PrintItem, pk=pk, status='published')
+    print_item = get_object_or_404(
+        PrintItem.objects.select_related('category', 'author__author_stats'),
+        pk=pk, status__in=PrintItem.PUBLIC_STATUSES,
+    )
     
     # Increment view count
     print_item.views_count += 1
     print_item.save(update_fields=['views_count'])
+    AuthorStats.objects.bump(print_item.author_id, views_count=1)
+    events.record('view', print_item, request.user)
     
+    return render(request, 'prints/print_detail.html', print_detail_context(request, print_item))
+
+
+def print_detail_context(request, print_item):
+    """Template context of the detail page; also used by prints.warmup"""
     # Get related prints
     related_prints = PrintItem.objects.filter(
         category=print_item.category,
-        status='published'
-    ).exclude(pk=pk)[:4]
+        status__in=PrintItem.PUBLIC_STATUSES
+    ).exclude(pk=print_item.pk)[:4]
+    
+    # First page of the gallery; one extra row tells whether there is more
+    gallery_images = list(gallery.gallery_images(print_item)[:gallery.GALLERY_PAGE_SIZE + 1])
+    gallery_next = None
+    if len(gallery_images) > gallery.GALLERY_PAGE_SIZE:
+        gallery_images = gallery_images[:gallery.GALLERY_PAGE_SIZE]
+        gallery_next = (
+            f"{reverse('prints:gallery', args=[print_item.pk])}?page=2&per_page={gallery.GALLERY_PAGE_SIZE}"
+        )
     
     # Get comments
-    comments = print_item.comments.all()
+    comments = print_item.comments.select_related('author')
     
     # Check if user has liked this print
     user_liked = False
@@ -99,13 +125,46 @@ def print_detail(request, pk):
             user=request.user
         ).exists()
     
-    context = {
+    return {
         'print_item': print_item,
         'related_prints': related_prints,
         'comments': comments,
+        'gallery_images': gallery_images,
+        'gallery_next': gallery_next,
         'user_liked': user_liked,
+        'filament_types': FILAMENT_DENSITIES,
     }
-    return render(request, 'prints/print_detail.html', context)
+
+
+@require_GET
+def print_estimate(request, pk):
+    """What-if print time and filament estimate for other slicer settings"""
+    print_item = get_object_or_404(
+        PrintItem.objects.only('stl_sha256', 'layer_height', 'infill_percentage', 'filament_type'),
+        pk=pk, status__in=PrintItem.PUBLIC_STATUSES,
+    )
+    if not print_item.stl_sha256:
+        return JsonResponse({'error': 'This print has no STL file to estimate from'}, status=404)
+    
+    try:
+        layer_height = float(request.GET.get('layer_height', print_item.layer_height))
+        infill = int(request.GET.get('infill', print_item.infill_percentage))
+    except ValueError:
+        return JsonResponse({'error': 'layer_height and infill must be numbers'}, status=400)
+    filament_type = request.GET.get('filament', print_item.filament_type)
+    if not 0.04 <= layer_height <= 1.0 or not 0 <= infill <= 100:
+        return JsonResponse({'error': 'layer_height must be 0.04-1.0 mm and infill 0-100%'}, status=400)
+    
+    try:
+        profile = get_profile(print_item.stl_sha256)
+    except ProfilePending as exc:
+        # New meshes are sliced by rebuild_stl_blobs, off the request path
+        response = JsonResponse({'error': str(exc)}, status=503)
+        response['Retry-After'] = 300
+        return response
+    except STLError as exc:
+        return JsonResponse({'error': str(exc)}, status=422)
+    return JsonResponse(estimate(profile, layer_height, infill, filament_type))
 
 
 def category_detail(request, slug):
@@ -128,7 +187,35 @@ def category_detail(request, slug):
     return render(request, 'prints/category_detail.html', context)
 
 
+def author_detail(request, username):
+    """Profile page listing an author's published prints"""
+    author = get_object_or_404(User.objects.select_related('author_stats'), username=username, is_active=True)
+    try:
+        stats = author.author_stats
+    except AuthorStats.DoesNotExist:
+        stats = AuthorStats(user=author)
+    
+    prints = PrintItem.objects.filter(
+        author=author,
+        status__in=PrintItem.PUBLIC_STATUSES
+    ).select_related('category').order_by('-published_at', '-pk')
+    
+    # The stats row already holds the total, so the paginator needs no COUNT
+    paginator = Paginator(prints, 12)
+    paginator.count = stats.prints_count
+    page_number = request.GET.get('page')
+    page_obj = paginator.get_page(page_number)
+    
+    context = {
+        'author': author,
+        'stats': stats,
+        'page_obj': page_obj,
+    }
+    return render(request, 'prints/author_detail.html', context)
+
+
 @login_required
+@rate_limit('like')
 def like_print(request, pk):
     """Like/unlike a print item"""
     if request.method == 'POST':
@@ -147,6 +234,9 @@ def like_print(request, pk):
             liked = True
         
         print_item.save(update_fields=['likes_count'])
+        if print_item.status in PrintItem.PUBLIC_STATUSES:
+            AuthorStats.objects.bump(print_item.author_id, likes_count=1 if liked else -1)
+        events.record('like' if liked else 'unlike', print_item, request.user)
         
         return JsonResponse({
             'liked': liked,
@@ -157,6 +247,7 @@ def like_print(request, pk):
 
 
 @login_required
+@rate_limit('comment')
 def add_comment(request, pk):
     """Add a comment to a print item"""
     if request.method == 'POST':
@@ -169,6 +260,7 @@ def add_comment(request, pk):
                 author=request.user,
                 content=content
             )
+            events.record('comment', print_item, request.user)
             messages.success(request, 'Your comment has been added!')
         else:
             messages.error(request, 'Comment cannot be empty.')
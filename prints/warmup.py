@@ -0,0 +1,165 @@
+"""
+Warm a freshly started process before it takes traffic.
+
+Run in every gunicorn worker by ``post_worker_init`` (see gunicorn.conf.py),
+because templates, the static manifest, the URL resolver and the database
+connection all live per process. The same routine backs the ``warm_cache``
+management command, run once per deploy by docker-entrypoint.sh, which also
+fills the shared cache (sitemaps, feeds) and loads the top prints' layer
+profiles.
+"""
+import logging
+import os
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.db.models import Count
+from django.http import HttpRequest
+from django.template import TemplateSyntaxError, engines
+from django.template.loader import render_to_string
+
+from . import feeds, sitemaps, views
+from .estimator import get_profile
+from .models import Category, PrintItem
+from .stl import STLError
+
+
+logger = logging.getLogger(__name__)
+
+TOP_CATEGORIES = 8
+TOP_PRINTS = 20
+
+
+class WarmupReport:
+    def __init__(self):
+        self.steps = []  # (label, seconds, detail)
+
+    def step(self, label, func, *args):
+        started = time.perf_counter()
+        detail = func(*args)
+        self.steps.append((label, time.perf_counter() - started, detail))
+        return detail
+
+    @property
+    def total(self):
+        return sum(seconds for _, seconds, _ in self.steps)
+
+    def lines(self):
+        for label, seconds, detail in self.steps:
+            yield f'{label:<22} {seconds * 1000:8.1f} ms  {detail}'
+        yield f'{"total":<22} {self.total * 1000:8.1f} ms'
+
+
+def compile_templates():
+    """Load every project template so the cached loader holds compiled copies"""
+    compiled = 0
+    for engine in engines.all():
+        for directory in engine.dirs:
+            for root, _, files in os.walk(directory):
+                for filename in files:
+                    if not filename.endswith(('.html', '.txt', '.xml')):
+                        continue
+                    name = os.path.relpath(os.path.join(root, filename), directory)
+                    try:
+                        engine.get_template(name)
+                        compiled += 1
+                    except TemplateSyntaxError:
+                        logger.exception('Cannot compile template %s', name)
+    return f'{compiled} templates'
+
+
+class WarmupRequest(HttpRequest):
+    """Anonymous GET for ``path`` on the public site (SITE_DOMAIN, SITE_SCHEME)
+
+    Sitemaps and feeds key their cache on the absolute site root, so warm-up
+    requests must carry the host real visitors use.
+    """
+
+    def __init__(self, path):
+        super().__init__()
+        self.method = 'GET'
+        self.path = self.path_info = path
+        self.META.update({
+            'REQUEST_METHOD': 'GET',
+            'PATH_INFO': path,
+            'HTTP_HOST': settings.SITE_DOMAIN,
+            'SERVER_NAME': settings.SITE_DOMAIN.split(':')[0],
+            'SERVER_PORT': '443' if settings.SITE_SCHEME == 'https' else '80',
+        })
+        self.user = AnonymousUser()
+
+    def _get_scheme(self):
+        return settings.SITE_SCHEME
+
+
+def render(view, pages):
+    """Render ``pages`` (``[(path, view_args)]``) through ``view``"""
+    for path, args in pages:
+        response = view(WarmupRequest(path), *args)
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+    return f'{len(pages)} pages'
+
+
+def render_prints(prints):
+    """Run the detail page's queries and template without counting a view"""
+    for print_item in prints:
+        request = WarmupRequest(print_item.get_absolute_url())
+        render_to_string('prints/print_detail.html', views.print_detail_context(request, print_item), request)
+    return f'{len(prints)} pages'
+
+
+def connect():
+    PrintItem.objects.exists()
+    return 'connected'
+
+
+def load_profiles(hashes):
+    loaded = 0
+    for sha256 in hashes:
+        try:
+            get_profile(sha256)
+            loaded += 1
+        except STLError:
+            pass
+    # The rest are not sliced yet; rebuild_stl_blobs does that
+    return f'{loaded} of {len(hashes)} profiles ready'
+
+
+def warm_up(top_categories=TOP_CATEGORIES, top_prints=TOP_PRINTS, profiles=False):
+    """Prime this process and the caches; returns a WarmupReport
+
+    ``profiles`` also loads the top prints' layer profiles and reports how many
+    are still waiting to be sliced by rebuild_stl_blobs. Only ``warm_cache``
+    asks for it; gunicorn workers load profiles on first use.
+    """
+    report = WarmupReport()
+
+    report.step('database', connect)
+    report.step('templates', compile_templates)
+    report.step('home', render, views.home, [('/', ())])
+
+    slugs = (
+        Category.objects.annotate(print_count=Count('prints'))
+        .order_by('-print_count')
+        .values_list('slug', flat=True)[:top_categories]
+    )
+    report.step('category pages', render, views.category_detail, [
+        (f'/category/{slug}/', (slug,)) for slug in slugs
+    ])
+
+    # Same query as the detail view, which would also count a visit
+    top = list(
+        PrintItem.objects.filter(status__in=PrintItem.PUBLIC_STATUSES)
+        .select_related('category', 'author__author_stats')
+        .order_by('-views_count')[:top_prints]
+    )
+    report.step('print pages', render_prints, top)
+    if profiles:
+        report.step('estimator', load_profiles, [item.stl_sha256 for item in top if item.stl_sha256])
+
+    report.step('sitemap index', render, sitemaps.sitemap_index, [('/sitemap.xml', ())])
+    report.step('feeds', render, feeds.LatestPrintsFeed(), [('/feeds/new/', ())])
+    return report